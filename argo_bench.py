@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xarray as xr
+from argo_synth import write_archive, sizes
+from argo_ingest import build_store, ensure_store
+from argo_reduce import regional_mean, open_stores
+from argo_trend import fit_trend, trend_input
+from argo_parallel import section_means, snap_latitudes
+from argo_render import section_spec, render_figures, figure_name, lat_label
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录峰值内存
+    resource = None
+
+# ===============================
+# 基准测试：在合成数据（argo_synth）上依次计时
+#   ingest   年文件和月文件写入 Zarr 缓存
+#   series   区域平均时间序列
+#   trend    深度–纬度线性趋势
+#   section  多进程计算纬度剖面时间平均
+#   render   批量输出剖面图
+# 每个阶段在新的 spawn 进程中运行，峰值内存（ru_maxrss）只反映该阶段；工作进程的峰值单独记录。
+# 结果写为 JSON，便于比较不同版本。
+# ===============================
+stages = ("ingest", "series", "trend", "section", "render")
+
+lat_range = (-65, -40)
+section_latitudes = [-65, -60, -55, -50, -45, -40]
+
+
+def _anomalies(data_dirs):
+    ds = open_stores(data_dirs)
+    return [name for name in ds.data_vars if name.endswith("_ANOMALY")]
+
+
+def stage_ingest(data_dirs, params):
+    for data_dir in data_dirs:
+        build_store(data_dir)
+
+
+def stage_series(data_dirs, params):
+    regional_mean(open_stores(data_dirs), _anomalies(data_dirs), lat_range=lat_range, weighting=params["weighting"])
+
+
+def stage_trend(data_dirs, params):
+    for data_dir in data_dirs:
+        ds = ensure_store(data_dir)
+        for name in _anomalies([data_dir]):
+            fit_trend(trend_input(ds, name, lat_range, zonal=True).to_dataset(), name)
+
+
+def stage_section(data_dirs, params):
+    for data_dir in data_dirs:
+        variables = list(ensure_store(data_dir).data_vars)
+        section_means(data_dir, section_latitudes, variables, lat_range=lat_range, n_workers=params["n_workers"])
+
+
+def stage_render(data_dirs, params):
+    specs = []
+    for data_dir in data_dirs:
+        ds = ensure_store(data_dir).sel(LATITUDE=slice(*lat_range))
+        latitudes = snap_latitudes(ds, section_latitudes)
+        for name in ds.data_vars:
+            field = ds[name] if "TIME" not in ds[name].dims else ds[name].isel(TIME=-1)
+            field = field.sel(LATITUDE=latitudes).load()
+            for lat in latitudes:
+                section = field.sel(LATITUDE=lat)
+                specs.append(section_spec(
+                    figure_name("bench", name, lat_label(lat)), section["LONGITUDE"], section["PRESSURE"], section,
+                    name, "Longitude", "Pressure (dbar)", f"{name} at {lat_label(lat)}"))
+    output_dir = os.path.join(params["work_dir"], "figures")
+    render_figures(specs, output_dir, formats=params["formats"], n_workers=params["n_workers"], skip_unchanged=False)
+
+
+stage_functions = {
+    "ingest": stage_ingest, "series": stage_series, "trend": stage_trend,
+    "section": stage_section, "render": stage_render,
+}
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run_stage(name, data_dirs, params):
+    """在独立进程中执行一个阶段，返回耗时和峰值内存"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    stage_functions[name](data_dirs, params)
+    result = {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu,
+              "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None}
+    if resource:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        result["workers_cpu_s"] = (after.ru_utime + after.ru_stime) - (children.ru_utime + children.ru_stime)
+        result["workers_peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return result
+
+
+def run_stage(name, data_dirs, params):
+    # 与 argo_parallel 一致使用 spawn：每次都是新进程，峰值内存互不影响
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_stage, name, data_dirs, params).result()
+
+
+def _summary(runs):
+    summary = {"runs": runs}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run[key] is not None]
+        if values:
+            summary[f"{key}_min"] = min(values)
+            summary[f"{key}_median"] = statistics.median(values)
+    return summary
+
+
+def run_benchmark(size="small", annual_years=3, monthly_months=3, selected=stages, repeat=3,
+                  n_workers=None, weighting="area", formats=("png",), work_dir=None, keep=False, seed=0):
+    """生成合成数据并运行所选阶段，返回可写为 JSON 的结果 dict"""
+    owns_work_dir = work_dir is None
+    if owns_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="argo_bench_")
+    params = {"n_workers": n_workers or os.cpu_count() or 1, "weighting": weighting,
+              "formats": list(formats), "work_dir": work_dir}
+
+    start = time.perf_counter()
+    data_dirs = list(write_archive(os.path.join(work_dir, "data"), size, annual_years, monthly_months, seed=seed).values())
+    generate_s = time.perf_counter() - start
+    if "ingest" not in selected:
+        for data_dir in data_dirs:
+            build_store(data_dir)
+
+    lat, lon, pressure = sizes[size] if isinstance(size, str) else size
+    results = {
+        "config": {
+            "size": size, "grid": {"LATITUDE": lat, "LONGITUDE": lon, "PRESSURE": pressure},
+            "months": annual_years * 12 + monthly_months, "repeat": repeat, **{k: v for k, v in params.items() if k != "work_dir"},
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "numpy": np.__version__, "xarray": xr.__version__,
+        },
+        "generate_s": generate_s,
+        "stages": {},
+    }
+    try:
+        for name in stages:
+            if name not in selected:
+                continue
+            print(f"正在测试 {name}")
+            results["stages"][name] = _summary([run_stage(name, data_dirs, params) for _ in range(repeat)])
+    finally:
+        if owns_work_dir and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在合成 RG Argo 数据上测试各处理阶段的耗时和峰值内存，结果写为 JSON")
+    parser.add_argument("--size", default="small", choices=sorted(sizes))
+    parser.add_argument("--years", type=int, default=3, help="年文件覆盖的年数")
+    parser.add_argument("--months", type=int, default=3, help="月文件个数")
+    parser.add_argument("--stages", nargs="+", default=list(stages), choices=stages)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--weighting", default="area")
+    parser.add_argument("--formats", nargs="+", default=["png"])
+    parser.add_argument("--work-dir", default=None, help="数据和图片的目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    parser.add_argument("--output", default=None, help="JSON 输出文件（默认打印）")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.size, args.years, args.months, args.stages, args.repeat, args.workers,
+                            args.weighting, args.formats, args.work_dir, args.keep)
+    text = json.dumps(results, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
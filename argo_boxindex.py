@@ -0,0 +1,205 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import xarray as xr
+from argo_ingest import ensure_store, store_chunks, store_digest
+from argo_reduce import cell_weights, products_dir
+from argo_trend import iter_time_blocks
+from argo_profile import stage, progress
+
+# ===============================
+# 前缀和（积分图）索引：对每个月分别沿 PRESSURE、LATITUDE（以及 LONGITUDE）累加
+#   S_wx = Σ w·x，S_w = Σ w（只计有效格点），S_n = 有效格点数
+# 任意矩形区域的加权平均只需读取 2^k 个角点（k 为维数），与区域大小无关，且一次得到所有月份。
+# 权重与 argo_reduce 一致："area" 为 cos(纬度)，"volume" 再乘以压力层厚度（按完整压力网格计算）；
+# "none" 为所有有效格点等权平均（不是 regional_mean 中"先经度深度、再纬度"的平均）。
+# ===============================
+index_fields = ("S_wx", "S_w", "S_n")
+
+# 索引的分块：TIME 与 Zarr 缓存一致，空间上分成小块，使角点读取只涉及少量小块
+index_chunks = {"TIME": store_chunks["TIME"], "PRESSURE_EDGE": 8, "LATITUDE_EDGE": 16, "LONGITUDE_EDGE": 32}
+
+
+def box_index_path(data_dir, variable, weighting="area", longitude=True):
+    suffix = "" if longitude else "_zonal"
+    return os.path.join(products_dir(data_dir), f"box_index_{variable}_{weighting}{suffix}.zarr")
+
+
+def _prefix(a, axes):
+    """在 axes 上前补一个 0 后逐轴累加，得到包含边界的前缀和"""
+    pad = [(0, 0)] * a.ndim
+    for axis in axes:
+        pad[axis] = (1, 0)
+    a = np.pad(a, pad)
+    for axis in axes:
+        np.cumsum(a, axis=axis, out=a)
+    return a
+
+
+def _block_index(block, weights, longitude):
+    """计算一个时间块的前缀和，返回 {字段: (TIME, PRESSURE_EDGE, LATITUDE_EDGE[, LONGITUDE_EDGE])}"""
+    x = np.asarray(block.transpose("TIME", "PRESSURE", "LATITUDE", "LONGITUDE").values, dtype=np.float64)
+    valid = np.isfinite(x)
+    w = 1.0 if weights is None else weights[np.newaxis, :, :, np.newaxis]
+    fields = {
+        "S_wx": np.where(valid, x * w, 0.0),
+        "S_w": np.where(valid, w, 0.0),
+        "S_n": valid.astype(np.float64),
+    }
+    if not longitude:
+        fields = {name: value.sum(axis=3) for name, value in fields.items()}
+    axes = (1, 2, 3) if longitude else (1, 2)
+    return {name: _prefix(value, axes) for name, value in fields.items()}
+
+
+def _edge_dims(longitude):
+    return ("TIME", "PRESSURE_EDGE", "LATITUDE_EDGE") + (("LONGITUDE_EDGE",) if longitude else ())
+
+
+def _weights(ds, weighting):
+    weights = cell_weights(ds, weighting)
+    if weights is None:
+        return None
+    return np.asarray(weights.broadcast_like(ds["PRESSURE"] * ds["LATITUDE"]).transpose("PRESSURE", "LATITUDE").values)
+
+
+def _write_blocks(path, da, weights, longitude, attrs, first):
+    """逐时间块计算前缀和并写入（或追加到）索引"""
+    dims = _edge_dims(longitude)
+    for block in progress(iter_time_blocks(da), "boxindex.read"):
+        with stage("boxindex.block"):
+            fields = _block_index(block, weights, longitude)
+            out = xr.Dataset({name: (dims, value) for name, value in fields.items()}, coords={"TIME": block["TIME"].values})
+            # 追加时也要带上属性，否则根属性会被空属性覆盖
+            out.attrs.update(attrs)
+            if first:
+                # 格点中心坐标单独保存，查询时据此把经纬度、压力范围换算为角点位置
+                for dim in ("PRESSURE", "LATITUDE", "LONGITUDE"):
+                    out[f"{dim}_CELL"] = (f"{dim}_CELL", da[dim].values)
+                # 只有 PRESSURE × LATITUDE 的索引很小，空间上不分块
+                shape = fields["S_wx"].shape
+                chunks = (index_chunks["TIME"],) + tuple(
+                    min(index_chunks[d], n) if longitude else n for d, n in zip(dims[1:], shape[1:]))
+                encoding = {name: {"chunks": chunks} for name in index_fields}
+                out.to_zarr(path, mode="w", encoding=encoding, consolidated=True)
+                first = False
+            else:
+                out.to_zarr(path, append_dim="TIME", consolidated=True)
+
+
+def build_box_index(data_dir, variable, weighting="area", longitude=True):
+    """为 variable 建立前缀和索引（longitude=False 时先沿经度求和，索引只有 PRESSURE × LATITUDE）"""
+    ds = ensure_store(data_dir)
+    path = box_index_path(data_dir, variable, weighting, longitude)
+    attrs = {"data_dir": data_dir, "variable": variable, "weighting": weighting, "longitude": int(longitude),
+             "store_digest": store_digest(data_dir)}
+    _write_blocks(path, ds[variable], _weights(ds, weighting), longitude, attrs, first=True)
+    return path
+
+
+def rewrite_months(path, ds, times):
+    """按新的数据重写索引中 times 这些月份（文件被替换后调用）"""
+    index = xr.open_zarr(path, consolidated=True)
+    longitude = bool(index.attrs["longitude"])
+    weights = _weights(ds, index.attrs["weighting"])
+    positions = np.searchsorted(index["TIME"].values, np.asarray(times, dtype=index["TIME"].dtype))
+    block = ds[index.attrs["variable"]].isel(TIME=positions).load()
+
+    fields = _block_index(block, weights, longitude)
+    dims = _edge_dims(longitude)
+    for month, position in enumerate(positions):
+        out = xr.Dataset({name: (dims, value[month:month + 1]) for name, value in fields.items()})
+        out.to_zarr(path, region={"TIME": slice(position, position + 1)}, consolidated=True)
+
+
+def set_store_digest(path, digest):
+    """更新索引记录的缓存摘要（argo_refresh 重写变化的月份之后调用）"""
+    attrs = dict(xr.open_zarr(path, consolidated=True).attrs)
+    attrs["store_digest"] = digest
+    # 根属性整体写入，只写属性不写变量
+    xr.Dataset(attrs=attrs).to_zarr(path, mode="a", consolidated=True)
+
+
+def load_box_index(data_dir, variable, weighting="area", longitude=True):
+    """打开索引；不存在或缓存内容有变化时重新建立，缓存只新增了月份时只追加这些月份"""
+    path = box_index_path(data_dir, variable, weighting, longitude)
+    if not os.path.exists(path):
+        build_box_index(data_dir, variable, weighting, longitude)
+        return BoxIndex(path)
+
+    ds = ensure_store(data_dir)
+    months = ds["TIME"].values
+    index = xr.open_zarr(path, consolidated=True)
+    indexed = index["TIME"].values
+    digest = store_digest(data_dir)
+    if (len(indexed) > len(months) or not np.array_equal(months[:len(indexed)], indexed)
+            or index.attrs.get("store_digest") != digest):
+        build_box_index(data_dir, variable, weighting, longitude)
+    elif len(indexed) < len(months):
+        da = ds[variable].isel(TIME=slice(len(indexed), None))
+        _write_blocks(path, da, _weights(ds, weighting), longitude, index.attrs, first=False)
+    return BoxIndex(path)
+
+
+# ===============================
+# 查询
+# ===============================
+class BoxIndex:
+    """前缀和索引的查询接口，范围的含义与 ds.sel(DIM=slice(lo, hi)) 相同（包含两端）"""
+
+    def __init__(self, path):
+        self.index = xr.open_zarr(path, consolidated=True)
+        self.longitude = bool(self.index.attrs["longitude"])
+        self.cells = {dim: self.index[f"{dim}_CELL"].values for dim in ("PRESSURE", "LATITUDE", "LONGITUDE")}
+
+    def _edges(self, dim, value_range):
+        cells = self.cells[dim]
+        if value_range is None:
+            return [0, len(cells)]
+        lo, hi = value_range
+        return [int(np.searchsorted(cells, lo, side="left")), int(np.searchsorted(cells, hi, side="right"))]
+
+    def box_sums(self, lat_range=None, pressure_range=None, lon_range=None):
+        """返回该区域内所有月份的 Σw·x、Σw 和有效格点数（容斥原理，只读取角点）"""
+        corners = {"PRESSURE_EDGE": self._edges("PRESSURE", pressure_range),
+                   "LATITUDE_EDGE": self._edges("LATITUDE", lat_range)}
+        if self.longitude:
+            corners["LONGITUDE_EDGE"] = self._edges("LONGITUDE", lon_range)
+        elif lon_range is not None:
+            raise ValueError("该索引已沿经度求和，不能再指定经度范围")
+
+        values = self.index[list(index_fields)].isel(corners).load()
+        # 角点符号：每个维度取上界为 +，取下界为 -
+        sign = 1
+        for dim in corners:
+            sign = sign * xr.DataArray([-1, 1], dims=dim)
+        sums = (values * sign).sum(dim=list(corners))
+        return sums
+
+    def mean(self, lat_range=None, pressure_range=None, lon_range=None):
+        """区域加权平均，返回以月份为索引的 pd.Series（没有有效格点的月份为 NaN）"""
+        sums = self.box_sums(lat_range, pressure_range, lon_range)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(sums["S_n"].values > 0, sums["S_wx"].values / sums["S_w"].values, np.nan)
+        return pd.Series(values, index=pd.DatetimeIndex(sums["TIME"].values, name="Month"),
+                         name=self.index.attrs["variable"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用前缀和索引快速计算任意纬度、压力（经度）范围的加权平均")
+    parser.add_argument("data_dir", help="年文件和月文件所在目录")
+    parser.add_argument("variable", help="例如 ARGO_TEMPERATURE_ANOMALY")
+    parser.add_argument("--weighting", default="area", help="none / area / volume")
+    parser.add_argument("--zonal", action="store_true", help="只建立 PRESSURE × LATITUDE 索引（体积小得多）")
+    parser.add_argument("--lat", nargs=2, type=float, default=None)
+    parser.add_argument("--pressure", nargs=2, type=float, default=None)
+    parser.add_argument("--lon", nargs=2, type=float, default=None)
+    parser.add_argument("--output", default=None, help="把结果写为 CSV")
+    args = parser.parse_args()
+
+    index = load_box_index(args.data_dir, args.variable, args.weighting, longitude=not args.zonal)
+    series = index.mean(args.lat, args.pressure, args.lon)
+    if args.output:
+        series.to_csv(args.output)
+    print(series)
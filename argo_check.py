@@ -0,0 +1,136 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import xarray as xr
+from argo_synth import write_archive, write_month, sizes
+from argo_ingest import build_store, ensure_store, open_store
+from argo_reduce import load_regional_mean, regional_mean, open_stores
+from argo_trend import load_trend, fit_trend, trend_input
+from argo_boxindex import load_box_index, build_box_index, box_index_path, index_fields
+from argo_refresh import refresh
+
+# ===============================
+# 增量更新的自检：在合成数据（argo_synth）上先生成缓存和派生产品，再追加一个月、重新发布一个已有月份，
+# 经 argo_refresh 增量更新后与从头计算的结果逐项比较：
+#   store     update_store 写入的 Zarr 缓存与 build_store 重新生成的缓存
+#   series    区域平均缓存与 regional_mean 直接计算
+#   trend     扣除旧数据（TrendAccumulator.remove）再累积的趋势与 fit_trend 直接拟合
+#   boxindex  重写、追加后的前缀和索引（三维和纬向）与重新建立的索引
+# 任何一项的相对差超过 tolerance 时以非零状态退出。
+# ===============================
+tolerance = 1e-9
+
+lat_range = (-65, -40)
+pressure_range = (0, 500)
+weightings = ("area", "volume")
+
+
+def _difference(a, b):
+    """a 相对于 b 的最大差（以 b 的最大绝对值为尺度）；形状或缺测位置不同时为 inf"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if a.shape != b.shape or not np.array_equal(np.isnan(a), np.isnan(b)):
+        return np.inf
+    valid = ~np.isnan(b)
+    if not valid.any():
+        return 0.0
+    scale = max(float(np.abs(b[valid]).max()), 1.0)
+    return float(np.abs(a[valid] - b[valid]).max()) / scale
+
+
+def _dataset_difference(a, b, names):
+    if not np.array_equal(a["TIME"].values, b["TIME"].values):
+        return np.inf
+    return max(_difference(a[name].values, b[name].values) for name in names)
+
+
+def _build_products(data_dirs, anomalies):
+    """生成各种派生产品的缓存（之后由 argo_refresh 增量更新）"""
+    for weighting in weightings:
+        load_regional_mean(data_dirs, anomalies, lat_range=lat_range, pressure_range=pressure_range, weighting=weighting)
+    for data_dir, variable in zip(data_dirs, anomalies):
+        for zonal in (True, False):
+            load_trend(data_dir, variable, lat_range, zonal)
+            load_box_index(data_dir, variable, "area", longitude=not zonal)
+
+
+def _compare(data_dirs, anomalies, work_dir):
+    """返回 {检查项: 最大相对差}"""
+    results = {}
+    for data_dir, variable in zip(data_dirs, anomalies):
+        kind = os.path.basename(data_dir)
+        store = ensure_store(data_dir).load()
+        rebuilt = open_store(build_store(data_dir, os.path.join(work_dir, "rebuilt", f"{kind}.zarr"))).load()
+        results[f"store {kind}"] = _dataset_difference(store, rebuilt, list(rebuilt.data_vars))
+
+        for zonal in (True, False):
+            label = "zonal" if zonal else "3d"
+            cached = load_trend(data_dir, variable, lat_range, zonal)
+            direct = fit_trend(trend_input(rebuilt, variable, lat_range, zonal).to_dataset(), variable)
+            results[f"trend {variable} {label}"] = max(_difference(cached[name].values, direct[name].values)
+                                                       for name in cached.data_vars)
+
+            # 先读出增量更新后的索引，再在同一路径重新建立
+            path = box_index_path(data_dir, variable, "area", longitude=not zonal)
+            load_box_index(data_dir, variable, "area", longitude=not zonal)
+            incremental = xr.open_zarr(path, consolidated=True).load()
+            build_box_index(data_dir, variable, "area", longitude=not zonal)
+            rebuilt_index = xr.open_zarr(path, consolidated=True).load()
+            results[f"boxindex {variable} {label}"] = _dataset_difference(incremental, rebuilt_index, index_fields)
+
+    ds = open_stores(data_dirs)
+    for weighting in weightings:
+        region = {"lat_range": lat_range, "pressure_range": pressure_range, "weighting": weighting}
+        cached = load_regional_mean(data_dirs, anomalies, **region)
+        direct = regional_mean(ds, anomalies, **region)
+        same_months = cached.index.equals(direct.index)
+        results[f"series {weighting}"] = max(_difference(cached[name].values, direct[name].values)
+                                             for name in anomalies) if same_months else np.inf
+    return results
+
+
+def run_check(size="tiny", annual_years=1, monthly_months=2, work_dir=None, keep=False, seed=0):
+    """生成合成数据并检查增量更新，返回 {检查项: 最大相对差}"""
+    owns_work_dir = work_dir is None
+    if owns_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="argo_check_")
+    try:
+        archive = write_archive(os.path.join(work_dir, "data"), size, annual_years, monthly_months, seed=seed)
+        data_dirs = list(archive.values())
+        anomalies = [f"ARGO_{name}_ANOMALY" for name in ("TEMPERATURE", "SALINITY")]
+        _build_products(data_dirs, anomalies)
+
+        # 追加一个新月份，并重新发布第一个月文件（异常场不同）
+        first_monthly = annual_years * 12
+        write_month(archive, first_monthly + monthly_months, size, seed=seed)
+        write_month(archive, first_monthly, size, seed=seed, anomaly_seed=seed + 1)
+        for data_dir in data_dirs:
+            refresh(data_dir)
+
+        return _compare(data_dirs, anomalies, work_dir)
+    finally:
+        if owns_work_dir and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在合成数据上检查增量更新（argo_refresh）与从头计算的结果是否一致")
+    parser.add_argument("--size", default="tiny", choices=sorted(sizes))
+    parser.add_argument("--years", type=int, default=1, help="年文件覆盖的年数")
+    parser.add_argument("--months", type=int, default=2, help="月文件个数（至少 1 个）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="数据目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    args = parser.parse_args()
+
+    results = run_check(args.size, args.years, args.months, args.work_dir, args.keep, args.seed)
+    failed = [name for name, difference in results.items() if not difference <= tolerance]
+    for name, difference in results.items():
+        print(f"{'不一致' if name in failed else '一致':<4} {name:<48} {difference:.3g}")
+    if failed:
+        print(f"{len(failed)} 项检查不一致（容差 {tolerance:g}）")
+        sys.exit(1)
+    print("增量更新与从头计算的结果一致")
@@ -0,0 +1,400 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import xarray as xr
+from argo_profile import stage, progress
+
+# ===============================
+# 1. 文件名正则表达式（温度、盐度两套数据通用）
+# ===============================
+# 匹配 2019-2024 的月文件（格式：RG_ArgoClim_YYYYMM_XXXX.nc）
+pattern_monthly = re.compile(r"RG_ArgoClim_(\d{6})_\d{4}\.nc")
+# 匹配 2004-2018 的年文件（格式：RG_ArgoClim_Temperature_XXXX.nc / RG_ArgoClim_Salinity_XXXX.nc）
+pattern_annual = re.compile(r"RG_ArgoClim_(?:Temperature|Salinity)_(\d{4})\.nc")
+# 派生产品只对应默认的文件名规则
+default_patterns = (pattern_annual, pattern_monthly)
+
+# Zarr 分块大小：按 TIME、PRESSURE、LATITUDE 分块，经度整条保留（-1 表示整个维度）
+store_chunks = {"TIME": 12, "PRESSURE": 20, "LATITUDE": 40, "LONGITUDE": -1}
+
+# TIME 在 Zarr 中的编码方式（固定起点，保证追加写入时编码一致）
+time_encoding = {"units": "days since 2004-01-01", "calendar": "proleptic_gregorian", "dtype": "int64"}
+
+# 清单文件：记录已写入缓存的每个源文件（大小、修改时间、SHA-1 和包含的月份）
+manifest_name = "argo_manifest.json"
+
+# 数据类型：由年文件名（或目录名）中的 Temperature / Salinity 确定，对应变量名中的 TEMPERATURE / SALINITY
+pattern_family = re.compile(r"RG_ArgoClim_(Temperature|Salinity)_")
+
+
+def default_store_path(data_dir):
+    """默认的 Zarr 缓存路径：与数据目录同级，例如 RG_ArgoClim_Temperature_2019.zarr"""
+    return os.path.normpath(data_dir) + ".zarr"
+
+
+def decode_time(time_values):
+    """把 "months since 2004-01-01" 一次性转换为每月 1 日的 datetime64，代替逐个 pd.DateOffset"""
+    months = np.asarray(time_values).astype(int)
+    return (np.datetime64("2004-01", "M") + months.astype("timedelta64[M]")).astype("datetime64[ns]")
+
+
+def classify(filename, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """返回 "annual"、"monthly"，不是 RG Argo 数据文件则返回 None"""
+    if pattern_annual.match(filename):
+        return "annual"
+    if pattern_monthly.match(filename):
+        return "monthly"
+    return None
+
+
+def list_source_files(data_dir, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """列出数据目录中的年文件和月文件，返回 [(文件名, 类型), ...]"""
+    files = []
+    for filename in sorted(os.listdir(data_dir)):
+        kind = classify(filename, pattern_annual, pattern_monthly)
+        if kind is not None:
+            files.append((filename, kind))
+    return files
+
+
+def archive_family(data_dir, files):
+    """返回 "TEMPERATURE"、"SALINITY"，无法确定时返回 None
+
+    真实的月文件同时包含温度和盐度异常，每个缓存只保留本数据目录对应的一类变量。
+    """
+    for name in [filename for filename, kind in files if kind == "annual"] + [os.path.basename(os.path.normpath(data_dir))]:
+        match = pattern_family.match(name)
+        if match:
+            return match.group(1).upper()
+    return None
+
+
+def _family_vars(ds, family):
+    """只保留 family 对应的变量（family 为 None 时保留全部）"""
+    if family is None:
+        return ds
+    return ds[[name for name in ds.data_vars if family in name]]
+
+
+def open_source_file(file_path, kind, pattern_monthly=pattern_monthly):
+    """打开单个 NetCDF 文件，并把 TIME 统一为 datetime64 维度
+
+    按 Zarr 缓存的时间块惰性读取，写入缓存时逐块读写，不会把整个年文件读入内存。
+    """
+    filename = os.path.basename(file_path)
+    with stage("ingest.open", filename):
+        ds = xr.open_dataset(file_path, decode_times=False, chunks={"TIME": store_chunks["TIME"]})
+
+    if kind == "annual":
+        with stage("ingest.decode_time", filename):
+            ds = ds.assign_coords(TIME=decode_time(ds["TIME"].values))
+    else:
+        month_str = pattern_monthly.match(filename).group(1)
+        time_point = pd.Timestamp(f"{month_str[:4]}-{month_str[4:]}")
+        if "TIME" not in ds.dims:
+            ds = ds.expand_dims("TIME")
+        ds = ds.assign_coords(TIME=[time_point])
+    return ds
+
+
+def _encoding(ds):
+    """为变量第一次写入生成分块编码；TIME 只在第一次写入时给出（缓存中已有 TIME 时不能再指定编码）"""
+    encoding = {"TIME": dict(time_encoding)} if "TIME" in ds.variables else {}
+    for name, var in ds.data_vars.items():
+        chunks = []
+        for dim, size in zip(var.dims, var.shape):
+            chunk = store_chunks.get(dim, -1)
+            chunks.append(size if chunk == -1 else chunk)
+        encoding[name] = {"chunks": tuple(chunks)}
+    return encoding
+
+
+def _align_time_chunks(ds, offset):
+    """把 TIME 的分块改为与缓存中从第 offset 个月开始的 Zarr 时间块对齐，逐块写入时不会有两块写入同一个 Zarr 块
+
+    第一块可能只写入已有 Zarr 块的一部分（如追加一个月），xarray 默认拒绝这种写入；
+    缓存只由一个进程按顺序写入，对齐之后写入时可以设置 safe_chunks=False。
+    """
+    size = store_chunks["TIME"]
+    n = ds.sizes["TIME"]
+    first = min(n, size - offset % size)
+    chunks = [first] + [size] * ((n - first) // size)
+    if (n - first) % size:
+        chunks.append((n - first) % size)
+    return ds.chunk({"TIME": tuple(chunks)})
+
+
+def _clear_encoding(ds):
+    # 去掉 NetCDF 的编码信息，避免与 Zarr 分块冲突
+    for var in ds.variables.values():
+        var.encoding = {}
+    return ds
+
+
+def build_store(data_dir, store_path=None, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """把年文件和月文件合并为一个按时间排序、分块的 Zarr 缓存（只需运行一次）"""
+    if store_path is None:
+        store_path = default_store_path(data_dir)
+
+    files = list_source_files(data_dir, pattern_annual, pattern_monthly)
+    if not files:
+        raise FileNotFoundError(f"{data_dir} 中没有找到 RG Argo 数据文件")
+
+    # 先只读取各文件的 TIME，按时间排序（文件名排序时年文件会排在月文件之后）
+    entries = sorted(_file_times(data_dir, files, pattern_monthly))
+
+    family = archive_family(data_dir, files)
+    manifest = {}
+    written = set()
+    last_time = None
+    n_months = 0
+    for times, filename, kind in progress(entries, file=lambda entry: entry[1]):
+        if last_time is not None and times[0] <= last_time:
+            raise ValueError(f"{filename} 的月份与已写入的数据重叠")
+        last_time = times[-1]
+
+        file_path = os.path.join(data_dir, filename)
+        with stage("ingest.file", filename):
+            ds = _family_vars(_clear_encoding(open_source_file(file_path, kind, pattern_monthly)), family)
+            with stage("ingest.write", filename):
+                written.update(_write_file(ds, store_path, first=not written, written=written, offset=n_months))
+            ds.close()
+            manifest[filename] = _manifest_entry(file_path, kind, times)
+            n_months += len(times)
+
+    write_manifest(store_path, manifest)
+    return store_path
+
+
+def _file_times(data_dir, files, pattern_monthly):
+    """只读取各文件的 TIME，返回 [(TIME 数组, 文件名, 类型), ...]"""
+    for filename, kind in files:
+        with stage("ingest.scan", filename), open_source_file(os.path.join(data_dir, filename), kind, pattern_monthly) as ds:
+            yield tuple(ds["TIME"].values), filename, kind
+
+
+def _write_file(ds, store_path, first, written, offset=0):
+    """把一个文件的数据写入（或追加到）Zarr 缓存，返回写入的变量名；offset 为缓存中已有的月份数"""
+    timed = [name for name in ds.data_vars if "TIME" in ds[name].dims]
+    static = [name for name in ds.data_vars if "TIME" not in ds[name].dims and name not in written]
+
+    if first:
+        ds = ds[timed + static]
+        ds.to_zarr(store_path, mode="w", encoding=_encoding(ds), consolidated=True)
+    else:
+        # 缓存中没有的随时间变化的变量不能追加（长度会与 TIME 不一致）
+        timed = [name for name in timed if name in written]
+        _align_time_chunks(ds[timed], offset).to_zarr(store_path, append_dim="TIME", consolidated=True, safe_chunks=False)
+        if static:
+            # 月文件在前时年文件才带来 *_MEAN 等不随时间变化的变量
+            new = ds[static].drop_vars("TIME", errors="ignore")
+            new.to_zarr(store_path, mode="a", encoding=_encoding(new), consolidated=True)
+    return timed + static
+
+
+# ===============================
+# 2. 清单与增量更新
+# ===============================
+def file_hash(file_path):
+    """分块计算文件的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_entry(file_path, kind, times, digest=None):
+    st = os.stat(file_path)
+    return {
+        "kind": kind,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha1": digest or file_hash(file_path),
+        "months": [str(np.datetime64(t, "M")) for t in times],
+    }
+
+
+def read_manifest(store_path):
+    path = os.path.join(store_path, manifest_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(store_path, manifest):
+    with open(os.path.join(store_path, manifest_name), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def changed_files(data_dir, manifest, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """对比清单，返回新增或内容有变化的文件 [(文件名, 类型, SHA-1), ...]
+
+    大小和修改时间都没变的文件直接跳过；只有修改时间变了而内容（SHA-1）没变的文件只更新清单。
+    """
+    changed = []
+    for filename, kind in list_source_files(data_dir, pattern_annual, pattern_monthly):
+        file_path = os.path.join(data_dir, filename)
+        st = os.stat(file_path)
+        entry = manifest.get(filename)
+        if entry is not None and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            continue
+        digest = file_hash(file_path)
+        if entry is not None and entry["sha1"] == digest:
+            entry["mtime"] = st.st_mtime
+            continue
+        changed.append((filename, kind, digest))
+    return changed
+
+
+def stale_files(data_dir, manifest, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """只比较大小和修改时间（不计算 SHA-1），返回新增、可能有变化或已删除的文件名"""
+    present = set()
+    stale = []
+    for filename, _ in list_source_files(data_dir, pattern_annual, pattern_monthly):
+        present.add(filename)
+        st = os.stat(os.path.join(data_dir, filename))
+        entry = manifest.get(filename)
+        if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+            stale.append(filename)
+    return stale + sorted(set(manifest) - present)
+
+
+def store_digest(data_dir, store_path=None):
+    """缓存内容的摘要（由清单中各文件的 SHA-1 和月份得到），派生产品据此判断是否过期"""
+    manifest = read_manifest(store_path or default_store_path(data_dir))
+    if manifest is None:
+        return ""
+    content = {filename: [entry["sha1"], entry["months"]] for filename, entry in manifest.items()}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def replaced_path(store_path):
+    """被替换月份的旧数据保存在缓存旁边的这个目录中，保留到下一次增量更新"""
+    return store_path + ".replaced"
+
+
+def update_store(data_dir, store_path=None, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """只把新增或有变化的文件写入已有缓存
+
+    返回变化列表 [{"file", "times", "old"}, ...]，其中 "old" 为被替换月份的旧数据（新增月份为 None），
+    供下游产品扣除旧的贡献；旧数据逐块复制到 replaced_path 中，以惰性方式打开。缓存无法增量更新（不存在、源文件被删除、月份与已有数据部分重叠）时
+    重新生成整个缓存并返回 None。
+    """
+    if store_path is None:
+        store_path = default_store_path(data_dir)
+
+    shutil.rmtree(replaced_path(store_path), ignore_errors=True)
+    manifest = read_manifest(store_path) if os.path.exists(store_path) else None
+    present = {filename for filename, _ in list_source_files(data_dir, pattern_annual, pattern_monthly)}
+    if manifest is None or set(manifest) - present:
+        print("缓存无法增量更新，重新生成")
+        build_store(data_dir, store_path, pattern_annual, pattern_monthly)
+        return None
+
+    changed = changed_files(data_dir, manifest, pattern_annual, pattern_monthly)
+    family = archive_family(data_dir, list_source_files(data_dir, pattern_annual, pattern_monthly))
+    digests = {filename: digest for filename, _, digest in changed}
+    entries = sorted(_file_times(data_dir, [(f, k) for f, k, _ in changed], pattern_monthly))
+
+    changes = []
+    for times, filename, kind in progress(entries, file=lambda entry: entry[1]):
+        file_path = os.path.join(data_dir, filename)
+        store = open_store(store_path)
+        store_times = store["TIME"].values
+        times = np.asarray(times, dtype=store_times.dtype)
+        start = np.searchsorted(store_times, times[0])
+        region = slice(start, start + len(times))
+
+        with stage("ingest.file", filename):
+            ds = _family_vars(_clear_encoding(open_source_file(file_path, kind, pattern_monthly)), family)
+            timed = [name for name in ds.data_vars if "TIME" in ds[name].dims and name in store]
+
+            if times[0] > store_times[-1]:
+                with stage("ingest.append", filename):
+                    _write_file(ds, store_path, first=False, written=set(store.data_vars), offset=len(store_times))
+                changes.append({"file": filename, "times": times, "old": None})
+            elif np.array_equal(store_times[region], times):
+                with stage("ingest.replace", filename):
+                    # 先把旧数据逐个时间块复制出来（年文件被替换时有整个文件那么大，不读入内存）
+                    old_path = os.path.join(replaced_path(store_path), f"{filename}.zarr")
+                    old = _clear_encoding(store[timed].isel(TIME=region).chunk({"TIME": store_chunks["TIME"]}))
+                    old.to_zarr(old_path, mode="w", consolidated=True)
+                    old = open_store(old_path)
+                    static = [c for c in ds.coords if "TIME" not in ds[c].dims]
+                    new = _align_time_chunks(ds[timed].drop_vars(static), region.start)
+                    new.to_zarr(store_path, region={"TIME": region}, consolidated=True, safe_chunks=False)
+                    untimed = [name for name in ds.data_vars if "TIME" not in ds[name].dims]
+                    if untimed:
+                        ds[untimed].drop_vars("TIME", errors="ignore").to_zarr(store_path, mode="a", consolidated=True)
+                changes.append({"file": filename, "times": times, "old": old})
+            else:
+                ds.close()
+                print(f"{filename} 的月份与已有数据部分重叠，重新生成缓存")
+                build_store(data_dir, store_path, pattern_annual, pattern_monthly)
+                return None
+
+            ds.close()
+            manifest[filename] = _manifest_entry(file_path, kind, times, digests[filename])
+
+    write_manifest(store_path, manifest)
+    return changes
+
+
+# ===============================
+# 3. 打开缓存
+# ===============================
+def open_store(store_path):
+    """以惰性方式打开 Zarr 缓存"""
+    return xr.open_zarr(store_path, consolidated=True)
+
+
+def ensure_store(data_dir, store_path=None, pattern_annual=pattern_annual, pattern_monthly=pattern_monthly):
+    """缓存不存在时先生成；源文件有新增或变化时先增量更新，然后打开缓存
+
+    默认缓存通过 argo_refresh.refresh 更新，派生产品（区域平均、趋势、前缀和索引）同时更新。
+    """
+    default = store_path is None
+    if default:
+        store_path = default_store_path(data_dir)
+    if not os.path.exists(store_path):
+        build_store(data_dir, store_path, pattern_annual, pattern_monthly)
+        return open_store(store_path)
+
+    with stage("ingest.check", os.path.basename(store_path)):
+        manifest = read_manifest(store_path)
+        stale = manifest is None or stale_files(data_dir, manifest, pattern_annual, pattern_monthly)
+    if stale:
+        if default and (pattern_annual, pattern_monthly) == default_patterns:
+            # argo_refresh 依赖本模块，在这里导入以避免循环导入
+            from argo_refresh import refresh
+            refresh(data_dir)
+        else:
+            update_store(data_dir, store_path, pattern_annual, pattern_monthly)
+    return open_store(store_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 RG Argo NetCDF 文件合并为 Zarr 缓存")
+    parser.add_argument("data_dir", help="年文件和月文件所在目录")
+    parser.add_argument("--store", default=None, help="Zarr 输出路径（默认与数据目录同级）")
+    parser.add_argument("--update", action="store_true", help="只写入新增或有变化的文件（默认缓存同时更新派生产品）")
+    args = parser.parse_args()
+
+    if args.update:
+        if args.store is None:
+            from argo_refresh import refresh
+            changes = refresh(args.data_dir)
+        else:
+            changes = update_store(args.data_dir, args.store)
+            changes = None if changes is None else len(changes)
+        print("已重新生成缓存" if changes is None else f"已更新 {changes} 个文件")
+    else:
+        path = build_store(args.data_dir, args.store)
+        print(f"已生成 {path}")
@@ -0,0 +1,165 @@
+import os
+import math
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xarray as xr
+from argo_ingest import ensure_store, open_store, default_store_path, list_source_files, open_source_file, store_chunks
+import argo_profile
+from argo_profile import stage, progress
+
+# ===============================
+# 多进程计算指定纬度剖面的时间平均：
+# 每个任务只读取一段 TIME 中选定的几个纬度，归约为部分和与有效点数，主进程再合并，
+# 不会拼接出完整的 TIME × PRESSURE × LATITUDE × LONGITUDE 数据立方体。
+# ===============================
+
+# 单个月份剖面数据在内存中的放大倍数（原始数据、float64 副本、有效值掩码）
+copies_per_month = 3
+
+
+def plan_workers(bytes_per_month, n_workers=None, max_memory=None, block_size=None, n_months=None):
+    """根据内存上限（所有进程合计，字节）确定进程数和每个任务的月份数
+
+    给出总月份数 n_months 时，任务不超过一个 Zarr 时间块，也不会多到让部分进程分不到任务。
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if block_size is None:
+        block_size = store_chunks["TIME"]
+
+    if max_memory is not None:
+        per_month = bytes_per_month * copies_per_month
+        n_workers = max(1, min(n_workers, int(max_memory // per_month)))
+        block_size = min(block_size, int(max_memory // n_workers // per_month))
+    if n_months is not None:
+        block_size = min(block_size, math.ceil(n_months / n_workers))
+    return n_workers, max(1, block_size)
+
+
+def partial_sums(values):
+    """沿第 0 维（TIME）求有效值的和与个数，NaN 不计入"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values)
+    return np.where(valid, values, 0.0).sum(axis=0), valid.sum(axis=0)
+
+
+def partial_mean(total, count):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _sources(data_dir, from_files):
+    """返回 [(来源, 类型, 月份数), ...]：Zarr 缓存，或 from_files=True 时的各个源文件"""
+    if not from_files:
+        return [(default_store_path(data_dir), "store", ensure_store(data_dir).sizes["TIME"])]
+
+    sources = []
+    for filename, kind in list_source_files(data_dir):
+        path = os.path.join(data_dir, filename)
+        with open_source_file(path, kind) as ds:
+            sources.append((path, kind, ds.sizes["TIME"]))
+    return sources
+
+
+def _tasks(sources, block_size):
+    """把数据拆成 (来源, 类型, 起始, 结束) 任务，年文件也按 block_size 个月拆开"""
+    return [(path, kind, start, min(start + block_size, n))
+            for path, kind, n in sources for start in range(0, n, block_size)]
+
+
+def _open_task(task):
+    path, kind, start, stop = task
+    ds = open_store(path) if kind == "store" else open_source_file(path, kind)
+    return ds, slice(start, stop)
+
+
+def snap_latitudes(ds, latitudes):
+    """把 latitudes 换成最近的格点纬度；网格较粗时几个纬度可能对应同一格点，只取一次，否则 LATITUDE 标签重复"""
+    return np.unique(ds["LATITUDE"].sel(LATITUDE=latitudes, method="nearest").values)
+
+
+def _select(ds, latitudes, lat_range):
+    if lat_range is not None:
+        ds = ds.sel(LATITUDE=slice(lat_range[0], lat_range[1]))
+    return ds.sel(LATITUDE=snap_latitudes(ds, latitudes))
+
+
+def _probe(data_dir, from_files):
+    """用于估算每个月数据量的 Dataset：from_files=True 时打开第一个源文件（优先年文件），不生成 Zarr 缓存"""
+    if not from_files:
+        return ensure_store(data_dir)
+    files = list_source_files(data_dir)
+    filename, kind = next((entry for entry in files if entry[1] == "annual"), files[0])
+    return open_source_file(os.path.join(data_dir, filename), kind)
+
+
+def _reduce_task(task, latitudes, variables, lat_range):
+    """在工作进程中执行：返回 {变量: (部分和, 有效点数)}、剖面坐标以及本任务的性能记录"""
+    path, _, start, stop = task
+    with stage("section.task", f"{os.path.basename(path)}[{start}:{stop}]"):
+        ds, time_slice = _open_task(task)
+        ds = _select(ds, latitudes, lat_range)
+
+        partials = {}
+        for name in variables:
+            if name not in ds:
+                continue
+            da = ds[name]
+            with stage("section.read", name):
+                if "TIME" in da.dims:
+                    values = da.isel(TIME=time_slice).transpose("TIME", ...).values
+                elif time_slice.start == 0:
+                    # 不随时间变化的变量（如 *_MEAN）每个来源只计一次
+                    values = da.values[np.newaxis]
+                else:
+                    continue
+            partials[name] = partial_sums(values)
+
+        ref = next(name for name in variables if name in ds)
+        dims = [d for d in ds[ref].dims if d != "TIME"]
+        coords = {dim: ds[dim].values for dim in dims}
+        ds.close()
+    return partials, dims, coords, argo_profile.drain()
+
+
+def section_means(data_dir, latitudes, variables, lat_range=None, n_workers=None, max_memory=None, from_files=False):
+    """多进程计算 variables 在各纬度剖面上的时间平均
+
+    from_files=True 时直接按原始 NetCDF 文件列表拆分任务，否则按 Zarr 缓存的时间块拆分。
+    max_memory 为所有进程合计的内存上限（字节）。
+    """
+    with _probe(data_dir, from_files) as probe:
+        probe = _select(probe, latitudes, lat_range)
+        timed = [name for name in variables if name in probe and "TIME" in probe[name].dims]
+        bytes_per_month = sum(probe[name].isel(TIME=0).size for name in timed) * 8
+    sources = _sources(data_dir, from_files)
+    n_months = sum(n for _, _, n in sources)
+    n_workers, block_size = plan_workers(bytes_per_month, n_workers, max_memory, n_months=n_months)
+
+    tasks = _tasks(sources, block_size)
+    reduce_task = partial(_reduce_task, latitudes=latitudes, variables=list(variables), lat_range=lat_range)
+    print(f"使用 {n_workers} 个进程处理 {len(tasks)} 个任务（每个任务最多 {block_size} 个月）")
+
+    if n_workers == 1:
+        return _merge(map(reduce_task, tasks), len(tasks))
+    # 主进程已打开 Zarr（其后台 I/O 线程在 fork 后会死锁），统一使用 spawn，与 Windows 行为一致
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return _merge(pool.map(reduce_task, tasks), len(tasks))
+
+
+def _merge(results, n_tasks):
+    """合并各任务的部分和与有效点数，得到时间平均"""
+    sums, counts = {}, {}
+    for partials, dims, coords, records in progress(results, "section.collect", total=n_tasks):
+        argo_profile.extend(records)
+        for name, (total, count) in partials.items():
+            if name in sums:
+                sums[name] += total
+                counts[name] += count
+            else:
+                sums[name], counts[name] = total, count
+
+    means = {name: (dims, partial_mean(sums[name], counts[name])) for name in sums}
+    return xr.Dataset(means, coords=coords)
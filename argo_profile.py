@@ -0,0 +1,277 @@
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import cProfile
+import threading
+import collections
+import multiprocessing
+from contextlib import contextmanager
+from tqdm import tqdm
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+# ===============================
+# 分阶段性能记录：每个阶段（以及每个文件、每个时间块）记录墙钟时间、CPU 时间、读取字节数和峰值内存。
+# 默认关闭；设置环境变量即可对任意脚本开启，不需要修改脚本：
+#   ARGO_PROFILE=profile.json            结果写为 JSON（.csv 则写为 CSV），程序结束时写出
+#   ARGO_PROFILE_CAPTURE=trend.block     对指定阶段另外做函数级分析
+#   ARGO_PROFILE_SAMPLER=cprofile        cprofile 写 <阶段>.<pid>.prof；sample 为采样分析，写 <阶段>.<pid>.folded
+# 也可以在代码中调用 enable(...)。
+#
+# 阶段名称：
+#   ingest.file / ingest.scan / ingest.open / ingest.decode_time   写入一个文件（含计算 SHA-1）、读取 TIME、打开 NetCDF、月份解码
+#   ingest.write / ingest.append / ingest.replace                   写入 Zarr（生成缓存、追加新月份、替换已有月份）
+#   ingest.check                                                    打开缓存前对比源文件与清单（大小和修改时间）
+#   reduce.select / reduce.compute                                  截取区域、计算区域平均（含读取 Zarr）
+#   trend.read / trend.block                                        读取一个时间块、累积趋势
+#   section.task / section.read / section.collect                   工作进程中的任务、读取剖面、主进程等待结果
+#   render.draw / render.save / render.collect                      matplotlib 绘图（contourf 等）、写文件、等待工作进程
+#   boxindex.read / boxindex.block                                  读取一个时间块、计算前缀和并写入索引
+#   query.read / query.feed                                         读取一个时间块、累积一个查询
+#   refresh.series / refresh.trend / refresh.boxindex               增量更新一个派生产品
+# 惰性计算的读取和解码发生在 compute / write / read 这些阶段中，而不是 open / select。
+# ===============================
+settings = {"enabled": False, "output": None, "capture": None, "sampler": "cprofile", "capture_dir": None}
+samplers = ("cprofile", "sample")
+
+records = []
+_stack = []
+_captures = {}
+_registered = []
+
+
+def enable(output=None, capture=None, sampler="cprofile", capture_dir=None):
+    """开启记录；output 为 .json 或 .csv 路径时在程序结束时写出"""
+    if sampler not in samplers:
+        raise ValueError(f"未知的分析方式 {sampler!r}，可选 {samplers}")
+    settings.update(enabled=True, output=output, capture=capture, sampler=sampler,
+                    capture_dir=capture_dir or (os.path.dirname(os.path.abspath(output)) if output else os.getcwd()))
+    # 工作进程（spawn）通过同样的环境变量开启，记录随结果返回主进程，不单独写文件
+    if output and multiprocessing.parent_process() is None and not _registered:
+        atexit.register(_write_at_exit)
+        _registered.append(True)
+
+
+def disable():
+    settings["enabled"] = False
+
+
+def _write_at_exit():
+    # 没有记录时也写出（例如全部结果都来自缓存），避免找不到输出文件
+    if settings["output"]:
+        write(settings["output"])
+        print(f"已写入性能记录 {settings['output']}", file=sys.stderr)
+
+
+# ===============================
+# 测量
+# ===============================
+def _bytes_read():
+    """本进程至今通过 read 系统调用读取的字节数（Linux 的 /proc/self/io），其他系统返回 None"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _peak_rss():
+    """峰值常驻内存（字节）：Linux 读取 VmHWM（可重置），否则为进程至今的峰值"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_rss():
+    """把 VmHWM 重置为当前内存，使每个阶段的峰值只反映该阶段（Linux 4.0 以上）"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class _Sampler:
+    """简单的采样分析：后台线程定时记录调用栈，输出 flamegraph / speedscope 可读的折叠格式"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.thread_id = None
+        self.running = False
+
+    def enable(self):
+        self.thread_id = threading.get_ident()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.running = False
+        self.thread.join()
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump_stats(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _capture_for(name):
+    if settings["capture"] != name:
+        return None
+    if name not in _captures:
+        _captures[name] = cProfile.Profile() if settings["sampler"] == "cprofile" else _Sampler()
+    return _captures[name]
+
+
+def _dump_captures():
+    """写出函数级分析结果；分析器在进程内一直累积，每次写出的是到目前为止的全部结果"""
+    suffix = ".prof" if settings["sampler"] == "cprofile" else ".folded"
+    for name, profiler in _captures.items():
+        os.makedirs(settings["capture_dir"], exist_ok=True)
+        profiler.dump_stats(os.path.join(settings["capture_dir"], f"{name}.{os.getpid()}{suffix}"))
+
+
+@contextmanager
+def stage(name, file=None):
+    """记录一个阶段；yield 的 dict 可在阶段内补充 file 等字段，设置 discard=True 则不保存"""
+    record = {"stage": name, "file": file}
+    if not settings["enabled"]:
+        yield record
+        return
+
+    # 嵌套阶段会重置峰值内存，先把外层到目前为止的峰值记下来
+    if _stack:
+        _stack[-1]["_peak"] = max(_stack[-1]["_peak"] or 0, _peak_rss() or 0)
+    _reset_peak_rss()
+    record.update(pid=os.getpid(), depth=len(_stack), start=time.time(), _peak=None)
+    _stack.append(record)
+
+    profiler = _capture_for(name)
+    read_start = _bytes_read()
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record["wall_s"] = time.perf_counter() - wall
+        record["cpu_s"] = time.process_time() - cpu
+        read_end = _bytes_read()
+        record["bytes_read"] = None if read_start is None else read_end - read_start
+        peak = max(record.pop("_peak") or 0, _peak_rss() or 0)
+        record["peak_rss_mb"] = peak / 1024 ** 2 if peak else None
+        _stack.pop()
+        if _stack:
+            _stack[-1]["_peak"] = max(_stack[-1]["_peak"] or 0, peak)
+        if not record.pop("discard", False):
+            records.append(record)
+
+
+def progress(iterable, name=None, file=None, total=None, desc=None):
+    """代替 tqdm(iterable)：显示进度条，并把取出每一项所花的时间（如读取一个时间块、等待工作进程）记录为阶段 name
+
+    阶段在交出该项之前结束，循环体不计入其中，循环体抛出异常也不会打乱阶段的嵌套；
+    循环体需要记录时在循环体中使用 stage。name 为 None 时只显示进度条。
+    file 为从每一项得到文件名的函数，文件名同时显示在进度条上。
+    """
+    bar = tqdm(iterable, total=total, desc=desc)
+    items = iter(bar)
+    while True:
+        with stage(name) as record:
+            record["discard"] = name is None
+            try:
+                item = next(items)
+            except StopIteration:
+                record["discard"] = True
+                return
+            if file is not None:
+                record["file"] = file(item)
+                bar.set_postfix_str(record["file"])
+        yield item
+
+
+# ===============================
+# 工作进程的记录
+# ===============================
+def drain():
+    """取出并清空本进程的记录（在工作进程中调用，随结果返回主进程）"""
+    if _captures and multiprocessing.parent_process() is not None:
+        _dump_captures()
+    taken = list(records)
+    records.clear()
+    return taken
+
+
+def extend(worker_records):
+    """在主进程中加入工作进程返回的记录"""
+    if settings["enabled"]:
+        records.extend(worker_records)
+
+
+# ===============================
+# 输出
+# ===============================
+fields = ("stage", "file", "pid", "depth", "start", "wall_s", "cpu_s", "bytes_read", "peak_rss_mb")
+
+
+def summarize(rows=None):
+    """按阶段汇总：次数、总墙钟时间、总 CPU 时间、总读取字节数和最大峰值内存"""
+    summary = {}
+    for row in records if rows is None else rows:
+        s = summary.setdefault(row["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "bytes_read": 0, "peak_rss_mb": 0.0})
+        s["count"] += 1
+        s["wall_s"] += row["wall_s"]
+        s["cpu_s"] += row["cpu_s"]
+        s["bytes_read"] += row["bytes_read"] or 0
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], row["peak_rss_mb"] or 0)
+    return summary
+
+
+def write(path):
+    """写出记录：.csv 为每条记录一行，其他扩展名写 JSON（含按阶段的汇总）"""
+    if _captures:
+        _dump_captures()
+    rows = sorted(records, key=lambda row: row["start"])
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows({key: row.get(key) for key in fields} for row in rows)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summarize(rows), "records": rows}, f, ensure_ascii=False, indent=1)
+
+
+if os.environ.get("ARGO_PROFILE"):
+    enable(os.environ["ARGO_PROFILE"], os.environ.get("ARGO_PROFILE_CAPTURE"), os.environ.get("ARGO_PROFILE_SAMPLER", "cprofile"))
@@ -0,0 +1,210 @@
+import os
+import argparse
+import pandas as pd
+import xarray as xr
+from argo_ingest import ensure_store, store_chunks
+from argo_reduce import select_region, reduce_region, cell_weights, weightings
+from argo_trend import TrendAccumulator, trend_input
+from argo_parallel import partial_sums, partial_mean, snap_latitudes
+from argo_profile import stage, progress
+
+# ===============================
+# 多查询引擎：在一份查询描述（YAML 文件或 Python dict）中列出多个变量、区域、深度范围和产品，
+# 按数据来源分组后每个时间块只读取一次（所有查询区域的外包框），再分发给每个需要它的查询。
+#
+# sources:
+#   temperature: D:\DSRS\temp\RG_ArgoClim_Temperature_2019
+#   salinity: D:\DSRS\temp\RG_ArgoClim_Salinity_2019
+# output_dir: D:\DSRS\temp\argo_queries        # 可选，结果写为 <name>.csv / <name>_<变量>.nc
+# queries:
+#   - name: acc_series
+#     product: series                          # series / section / trend
+#     variables: [ARGO_TEMPERATURE_ANOMALY, ARGO_SALINITY_ANOMALY]
+#     lat: [-65, -40]                          # lat / lon / pressure 省略表示不限制
+#     pressure: [0, 2000]
+#     weighting: none                          # 仅 series：none / area / volume
+#   - name: acc_sections
+#     product: section
+#     variables: [ARGO_TEMPERATURE_ANOMALY, ARGO_TEMPERATURE_MEAN]
+#     lat: [-65, -40]
+#     latitudes: [-65, -60, -55, -50, -45, -40]  # section 必须给出
+#   - name: acc_trend
+#     product: trend
+#     variables: [ARGO_SALINITY_ANOMALY]
+#     lat: [-65, -40]
+#     zonal: true                              # 仅 trend：先沿经度取平均
+# ===============================
+products = ("series", "section", "trend")
+
+
+def load_spec(spec):
+    """spec 可以是 YAML 文件路径或已解析的 dict，返回补全默认值后的 dict"""
+    if isinstance(spec, str):
+        import yaml
+        with open(spec, encoding="utf-8") as f:
+            spec = yaml.safe_load(f)
+
+    queries = []
+    for query in spec["queries"]:
+        query = dict(query)
+        if query.get("product") not in products:
+            raise ValueError(f"查询 {query.get('name')!r} 的 product 必须是 {products} 之一")
+        if query["product"] == "section" and not query.get("latitudes"):
+            raise ValueError(f"查询 {query['name']!r} 为 section，需要给出 latitudes")
+        if query.get("weighting", "none") not in weightings:
+            raise ValueError(f"查询 {query['name']!r} 的 weighting 必须是 {weightings} 之一")
+        for key in ("lat", "lon", "pressure"):
+            query[key] = tuple(query[key]) if query.get(key) is not None else None
+        query.setdefault("weighting", "none")
+        query.setdefault("zonal", False)
+        query["variables"] = list(query["variables"])
+        queries.append(query)
+
+    names = [query["name"] for query in queries]
+    if len(set(names)) != len(names):
+        raise ValueError("查询名称不能重复")
+    return {"sources": dict(spec["sources"]), "output_dir": spec.get("output_dir"), "queries": queries}
+
+
+# ===============================
+# 1. 规划：按来源分组，求外包框
+# ===============================
+def _union(ranges):
+    """多个范围的外包范围，任一为 None（不限制）则结果为 None"""
+    if any(r is None for r in ranges):
+        return None
+    return (min(min(r) for r in ranges), max(max(r) for r in ranges))
+
+
+def plan(spec):
+    """返回每个来源的读取计划：{"data_dir", "variables", "box", "queries": [(查询, 该来源的变量), ...]}"""
+    stores = {name: ensure_store(data_dir) for name, data_dir in spec["sources"].items()}
+
+    plans = {}
+    for query in spec["queries"]:
+        for variable in query["variables"]:
+            source = next((name for name, ds in stores.items() if variable in ds), None)
+            if source is None:
+                raise ValueError(f"没有数据来源包含变量 {variable}")
+            p = plans.setdefault(source, {"data_dir": spec["sources"][source], "variables": [], "queries": {}})
+            if variable not in p["variables"]:
+                p["variables"].append(variable)
+            p["queries"].setdefault(query["name"], (query, []))[1].append(variable)
+
+    for p in plans.values():
+        p["queries"] = list(p["queries"].values())
+        queries = [query for query, _ in p["queries"]]
+        p["box"] = {key: _union([query[key] for query in queries]) for key in ("lat", "pressure", "lon")}
+    return list(plans.values())
+
+
+# ===============================
+# 2. 分发：每个查询在内存中的时间块上累积
+# ===============================
+def _new_state(query):
+    return {"series": [], "sums": {}, "counts": {}, "static": {}, "coords": None, "trends": {}}
+
+
+def _select(block, query):
+    return select_region(block, query["lat"], query["pressure"], query["lon"])
+
+
+def _feed(query, variables, block, state, weights):
+    sub = _select(block, query)
+    timed = [v for v in variables if "TIME" in sub[v].dims]
+
+    if query["product"] == "series":
+        if timed:
+            reduced = reduce_region(sub, timed, query["weighting"], weights[query["weighting"]])
+            state["series"].append(reduced.to_dataframe()[timed])
+
+    elif query["product"] == "section":
+        sub = sub.sel(LATITUDE=snap_latitudes(sub, query["latitudes"]))
+        for v in variables:
+            da = sub[v]
+            if "TIME" not in da.dims:
+                state["static"][v] = da
+                continue
+            total, count = partial_sums(da.transpose("TIME", ...).values)
+            if v in state["sums"]:
+                state["sums"][v] += total
+                state["counts"][v] += count
+            else:
+                state["sums"][v], state["counts"][v] = total, count
+                state["coords"] = da.isel(TIME=0, drop=True)
+
+    else:
+        for v in timed:
+            acc = state["trends"].setdefault(v, TrendAccumulator())
+            acc.update(trend_input(sub, v, zonal=query["zonal"]))
+
+
+def _finish(query, state):
+    if query["product"] == "series":
+        df = pd.concat(state["series"]) if state["series"] else pd.DataFrame()
+        df = df.groupby(level=0).first().sort_index()
+        df.index.name = "Month"
+        return df[[v for v in query["variables"] if v in df.columns]]
+
+    if query["product"] == "section":
+        fields = dict(state["static"])
+        for v, total in state["sums"].items():
+            ref = state["coords"]
+            fields[v] = xr.DataArray(partial_mean(total, state["counts"][v]), dims=ref.dims, coords=ref.coords)
+        return xr.Dataset(fields)
+
+    return {v: acc.result() for v, acc in state["trends"].items()}
+
+
+def run_queries(spec, block_size=None):
+    """执行全部查询，返回 {查询名: 结果}
+
+    series 返回以月份为索引的 DataFrame，section 返回各变量时间平均剖面的 Dataset，
+    trend 返回 {变量: 趋势 Dataset}。
+    """
+    spec = load_spec(spec)
+    states = {query["name"]: _new_state(query) for query in spec["queries"]}
+
+    for p in plan(spec):
+        print(f"正在读取 {p['data_dir']}：{len(p['queries'])} 个查询共用一次读取")
+        store = ensure_store(p["data_dir"])
+        # 权重在完整网格上计算（压力层厚度取决于相邻层），各查询再按自己的区域截取
+        weights = {weighting: cell_weights(store, weighting) for weighting in weightings}
+        ds = select_region(store[p["variables"]], p["box"]["lat"], p["box"]["pressure"], p["box"]["lon"])
+        static = ds[[v for v in p["variables"] if "TIME" not in ds[v].dims]].load()
+        timed = [v for v in p["variables"] if "TIME" in ds[v].dims]
+
+        size = block_size or store_chunks["TIME"]
+        for start in progress(range(0, ds.sizes["TIME"], size)):
+            with stage("query.read", p["data_dir"]):
+                block = xr.merge([ds[timed].isel(TIME=slice(start, start + size)).load(), static])
+            for query, variables in p["queries"]:
+                with stage("query.feed", query["name"]):
+                    _feed(query, variables, block, states[query["name"]], weights)
+
+    results = {query["name"]: _finish(query, states[query["name"]]) for query in spec["queries"]}
+    if spec["output_dir"]:
+        write_results(results, spec["output_dir"])
+    return results
+
+
+def write_results(results, output_dir):
+    """series 写为 <name>.csv，section 写为 <name>.nc，trend 写为 <name>_<变量>.nc"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name, result in results.items():
+        if isinstance(result, pd.DataFrame):
+            result.to_csv(os.path.join(output_dir, f"{name}.csv"))
+        elif isinstance(result, xr.Dataset):
+            result.to_netcdf(os.path.join(output_dir, f"{name}.nc"))
+        else:
+            for variable, trend in result.items():
+                trend.to_netcdf(os.path.join(output_dir, f"{name}_{variable}.nc"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按查询描述文件一次读取数据，计算多个区域、深度范围和变量的产品")
+    parser.add_argument("spec", help="YAML 查询描述文件")
+    args = parser.parse_args()
+
+    for name, result in run_queries(args.spec).items():
+        print(f"已完成 {name}")
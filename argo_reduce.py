@@ -0,0 +1,176 @@
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+from argo_ingest import ensure_store, default_store_path, store_digest
+from argo_profile import stage
+
+# ===============================
+# 1. 权重
+# ===============================
+# "none"：与原脚本一致，先对经度和深度取平均，再对纬度取平均
+# "area"：按 cos(纬度) 加权
+# "volume"：按 cos(纬度) × 压力层厚度加权
+weightings = ("none", "area", "volume")
+
+
+def layer_thickness(pressure):
+    """各压力层的厚度（dbar），以相邻层的中点为界，海表取 0"""
+    p = np.asarray(pressure, dtype=float)
+    edges = np.empty(len(p) + 1)
+    edges[0] = 0.0
+    edges[1:-1] = (p[:-1] + p[1:]) / 2
+    edges[-1] = p[-1] + (p[-1] - edges[-2])
+    return np.diff(edges)
+
+
+def cell_weights(ds, weighting):
+    """返回可广播到数据上的权重，"none" 返回 None
+
+    压力层厚度取决于相邻层，ds 须为完整的压力网格；截取部分深度时先在完整网格上计算，再随数据一起截取。
+    """
+    if weighting not in weightings:
+        raise ValueError(f"未知的加权方式 {weighting!r}，可选 {weightings}")
+    if weighting == "none":
+        return None
+
+    weights = np.cos(np.deg2rad(ds["LATITUDE"]))
+    if weighting == "volume":
+        weights = weights * xr.DataArray(layer_thickness(ds["PRESSURE"].values), coords={"PRESSURE": ds["PRESSURE"]})
+    return weights
+
+
+def select_region(ds, lat_range=None, pressure_range=None, lon_range=None):
+    """按纬度、压力、经度范围截取数据，None 表示不限制"""
+    region = {}
+    if lat_range is not None:
+        region["LATITUDE"] = slice(lat_range[0], lat_range[1])
+    if pressure_range is not None:
+        region["PRESSURE"] = slice(pressure_range[0], pressure_range[1])
+    if lon_range is not None:
+        region["LONGITUDE"] = slice(lon_range[0], lon_range[1])
+    return ds.sel(region)
+
+
+# ===============================
+# 2. 区域平均时间序列
+# ===============================
+def reduce_region(ds, variables, weighting="none", weights=None):
+    """对已截取好的区域求平均，返回惰性的 Dataset（只保留 TIME 维度）
+
+    weights 为在完整网格上用 cell_weights 算好的权重，这里按 ds 的坐标截取；省略时直接用 ds 的网格计算。
+    """
+    if weights is None:
+        weights = cell_weights(ds, weighting)
+    elif weighting != "none":
+        weights = weights.sel({dim: ds[dim] for dim in weights.dims})
+    reduced = {}
+    for name in variables:
+        da = ds[name]
+        if weights is None:
+            reduced[name] = da.mean(dim=["LONGITUDE", "PRESSURE"]).mean(dim="LATITUDE")
+        else:
+            reduced[name] = da.weighted(weights).mean(dim=["LONGITUDE", "PRESSURE", "LATITUDE"])
+    return xr.Dataset(reduced)
+
+
+def regional_mean(ds, variables, lat_range=None, pressure_range=None, lon_range=None, weighting="none"):
+    """一次遍历数据，计算所有变量、所有月份的区域平均
+
+    variables 为字符串时返回 pd.Series，为列表时返回以月份为索引的 pd.DataFrame。
+    """
+    names = [variables] if isinstance(variables, str) else list(variables)
+    weights = cell_weights(ds, weighting)
+    with stage("reduce.select"):
+        ds = select_region(ds, lat_range, pressure_range, lon_range)
+
+    # 所有变量在同一次 compute 中完成，不再逐月 .sel(...).item()
+    with stage("reduce.compute"):
+        df = reduce_region(ds, names, weighting, weights).compute().to_dataframe()[names]
+    df.index.name = "Month"
+    return df[names[0]] if isinstance(variables, str) else df
+
+
+# ===============================
+# 3. 温度与盐度一起计算并缓存
+# ===============================
+def products_dir(data_dir):
+    """派生产品（时间序列缓存等）所在目录，与 Zarr 缓存同级"""
+    return os.path.join(os.path.dirname(default_store_path(data_dir)), "argo_products")
+
+
+def range_key(name, value):
+    return f"{name}All" if value is None else f"{name}{value[0]:g}_{value[1]:g}"
+
+
+def series_cache_path(data_dir, lat_range=None, pressure_range=None, lon_range=None, weighting="none"):
+    """区域平均缓存文件名由区域和加权方式决定，温度、盐度脚本共用同一个文件"""
+    key = "_".join([range_key("lat", lat_range), range_key("p", pressure_range),
+                    range_key("lon", lon_range), weighting])
+    return os.path.join(products_dir(data_dir), f"regional_mean_{key}.nc")
+
+
+def open_stores(data_dirs):
+    """打开多个数据目录的 Zarr 缓存（如温度和盐度）并合并为一个 Dataset"""
+    return xr.merge([ensure_store(d) for d in data_dirs], join="outer", compat="override")
+
+
+def read_series_cache(cache_path):
+    """读取区域平均缓存，返回 (DataFrame, 计算参数)"""
+    with xr.open_dataset(cache_path) as cached:
+        attrs = dict(cached.attrs)
+        df = cached.load().to_dataframe()
+    params = {
+        "data_dirs": [str(d) for d in np.atleast_1d(attrs["data_dirs"])],
+        "lat_range": tuple(attrs["lat_range"]) if "lat_range" in attrs else None,
+        "pressure_range": tuple(attrs["pressure_range"]) if "pressure_range" in attrs else None,
+        "lon_range": tuple(attrs["lon_range"]) if "lon_range" in attrs else None,
+        "weighting": attrs["weighting"],
+        "store_digests": [str(d) for d in np.atleast_1d(attrs.get("store_digests", []))],
+    }
+    return df, params
+
+
+def write_series_cache(cache_path, df, data_dirs, lat_range=None, pressure_range=None, lon_range=None, weighting="none"):
+    # 把计算参数写入属性，增量更新时据此补算新月份；各缓存的摘要用于发现过期的结果
+    cached = xr.Dataset.from_dataframe(df)
+    cached.attrs["data_dirs"] = list(data_dirs)
+    cached.attrs["store_digests"] = [store_digest(d) for d in data_dirs]
+    cached.attrs["weighting"] = weighting
+    for name, value in (("lat_range", lat_range), ("pressure_range", pressure_range), ("lon_range", lon_range)):
+        if value is not None:
+            cached.attrs[name] = np.asarray(value, dtype=float)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    cached.to_netcdf(cache_path)
+
+
+def load_regional_mean(data_dirs, variables, lat_range=None, pressure_range=None, lon_range=None, weighting="none"):
+    """读取区域平均缓存，只补算缓存中缺少的月份；缓存缺少变量时对所有变量一次性重新计算
+
+    data_dirs 中第一个目录必须存在，其余目录（如一起计算的盐度数据）不存在时跳过，其变量不出现在结果中。
+    """
+    data_dirs = [data_dirs[0]] + [d for d in data_dirs[1:] if os.path.isdir(d)]
+    ds = open_stores(data_dirs)
+    variables = [name for name in variables if name in ds]
+    region = {"lat_range": lat_range, "pressure_range": pressure_range, "lon_range": lon_range, "weighting": weighting}
+    cache_path = series_cache_path(data_dirs[0], **region)
+    months = pd.DatetimeIndex(ds["TIME"].values, name="Month")
+
+    df = None
+    if os.path.exists(cache_path):
+        df, params = read_series_cache(cache_path)
+        current = [store_digest(d) for d in data_dirs]
+        if not (set(variables) <= set(df.columns) and df.index.isin(months).all() and params["store_digests"] == current):
+            df = None
+
+    if df is None:
+        df = regional_mean(ds, list(variables), **region)
+    else:
+        missing = months.difference(df.index)
+        if missing.empty:
+            return df[list(variables)]
+        added = regional_mean(ds.sel(TIME=missing), list(df.columns), **region)
+        df = pd.concat([df, added]).sort_index()
+
+    write_series_cache(cache_path, df, data_dirs, **region)
+    return df[list(variables)]
@@ -0,0 +1,116 @@
+import os
+import glob
+import argparse
+import shutil
+import xarray as xr
+from argo_ingest import update_store, ensure_store, store_digest
+from argo_reduce import products_dir, read_series_cache, write_series_cache, load_regional_mean
+from argo_trend import TrendAccumulator, trend_input, load_trend
+from argo_boxindex import rewrite_months, set_store_digest, load_box_index
+from argo_profile import stage, progress
+
+# ===============================
+# 每月新文件到达后的增量更新：
+# 1. 只把新增或有变化的文件写入 Zarr 缓存
+# 2. 区域平均缓存删去有变化的月份，再补算缺少的月份
+# 3. 趋势累积量扣除被替换月份的旧数据，再累积缺少的月份
+# 4. 前缀和索引重写被替换的月份，再追加缺少的月份
+# ===============================
+
+
+def _same_dir(a, b):
+    return os.path.normcase(os.path.normpath(a)) == os.path.normcase(os.path.normpath(b))
+
+
+def refresh_series(data_dir, changes):
+    """更新所有包含 data_dir 的区域平均缓存"""
+    paths = sorted(glob.glob(os.path.join(products_dir(data_dir), "regional_mean_*.nc")))
+    for cache_path in progress(paths, file=os.path.basename):
+        df, params = read_series_cache(cache_path)
+        data_dirs = params.pop("data_dirs")
+        params.pop("store_digests")
+        if not any(_same_dir(d, data_dir) for d in data_dirs):
+            continue
+
+        if changes is None:
+            os.remove(cache_path)
+            continue
+
+        # 新增月份也要删去：另一套数据（如盐度）先到时，这些月份的本变量值仍是 NaN。
+        # 写回时记录新的缓存摘要，load_regional_mean 才会只补算这些月份
+        changed = [t for change in changes for t in change["times"]]
+        with stage("refresh.series", os.path.basename(cache_path)):
+            write_series_cache(cache_path, df.drop(index=changed, errors="ignore"), data_dirs, **params)
+            load_regional_mean(data_dirs, list(df.columns), **params)
+
+
+def refresh_trends(data_dir, changes):
+    """更新所有由 data_dir 累积的趋势"""
+    paths = sorted(glob.glob(os.path.join(products_dir(data_dir), "trend_*.nc")))
+    for cache_path in progress(paths, file=os.path.basename):
+        acc = TrendAccumulator.load(cache_path)
+        if not _same_dir(acc.attrs["data_dir"], data_dir):
+            continue
+
+        if changes is None:
+            os.remove(cache_path)
+            continue
+
+        variable = acc.attrs["variable"]
+        lat_range = tuple(acc.attrs["lat_range"]) if "lat_range" in acc.attrs else None
+        zonal = bool(acc.attrs["zonal"])
+        with stage("refresh.trend", os.path.basename(cache_path)):
+            for change in changes:
+                if change["old"] is None or variable not in change["old"]:
+                    continue
+                old = trend_input(change["old"], variable, lat_range, zonal)
+                old = old.sel(TIME=old["TIME"].isin(acc.months.values))
+                if old.sizes["TIME"]:
+                    acc.remove(old)
+            acc.attrs["store_digest"] = store_digest(data_dir)
+            acc.save(cache_path)
+            load_trend(data_dir, variable, lat_range, zonal, t0=acc.t0)
+
+
+def refresh_box_indexes(data_dir, changes):
+    """更新所有由 data_dir 建立的前缀和索引（每个月份的索引互相独立，直接重写即可）"""
+    paths = sorted(glob.glob(os.path.join(products_dir(data_dir), "box_index_*.zarr")))
+    for index_path in progress(paths, file=os.path.basename):
+        attrs = xr.open_zarr(index_path, consolidated=True).attrs
+        if not _same_dir(attrs["data_dir"], data_dir):
+            continue
+
+        if changes is None:
+            shutil.rmtree(index_path)
+            continue
+
+        replaced = [t for change in changes if change["old"] is not None for t in change["times"]]
+        with stage("refresh.boxindex", os.path.basename(index_path)):
+            if replaced:
+                rewrite_months(index_path, ensure_store(data_dir), replaced)
+            set_store_digest(index_path, store_digest(data_dir))
+            load_box_index(data_dir, attrs["variable"], attrs["weighting"], bool(attrs["longitude"]))
+
+
+def refresh(data_dir):
+    """增量更新缓存及其派生产品，返回变化的文件数（None 表示缓存被重新生成）"""
+    changes = update_store(data_dir)
+    if changes is None:
+        print("缓存已重新生成，派生产品将在下次使用时重新计算")
+    elif not changes:
+        print("没有新增或变化的文件")
+        return 0
+
+    refresh_series(data_dir, changes)
+    refresh_trends(data_dir, changes)
+    refresh_box_indexes(data_dir, changes)
+    return None if changes is None else len(changes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="新的 RG_ArgoClim_YYYYMM 文件到达后增量更新缓存和派生产品")
+    parser.add_argument("data_dirs", nargs="+", help="年文件和月文件所在目录（可以同时给出温度和盐度目录）")
+    args = parser.parse_args()
+
+    for data_dir in args.data_dirs:
+        refresh(data_dir)
@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.style
+from matplotlib.figure import Figure
+import argo_profile
+from argo_profile import stage, progress
+
+# ===============================
+# 图件描述：每张图是一个普通 dict（可在进程间传递），包含绘图所需的全部数组和样式。
+# 交互模式用 pyplot 逐张显示；批量模式在工作进程中用 Agg 直接写文件，不需要显示器。
+# ===============================
+render_manifest_name = "render_manifest.json"
+
+
+def lat_label(lat):
+    """纬度写成文件名用的标签，例如 -65 -> 65S"""
+    return f"{abs(lat):g}{'S' if lat < 0 else 'N'}"
+
+
+def figure_name(*parts):
+    """由产品、变量、纬度等拼出确定的文件名（不含扩展名）"""
+    return "_".join(str(part) for part in parts)
+
+
+def section_spec(name, x, y, field, colorbar_label, xlabel, ylabel, title, levels=20, cmap="RdBu_r",
+                 extend="neither", contour=None, contour_levels=None, contour_style=None, figsize=(12, 8)):
+    """剖面图（contourf + 颜色条，可叠加等值线），y 轴为压力并翻转"""
+    return {
+        "name": name, "kind": "section", "figsize": figsize,
+        "x": np.asarray(x), "y": np.asarray(y), "field": np.asarray(field),
+        "levels": levels, "cmap": cmap, "extend": extend, "colorbar_label": colorbar_label,
+        "contour": None if contour is None else np.asarray(contour),
+        "contour_levels": contour_levels, "contour_style": contour_style or {},
+        "xlabel": xlabel, "ylabel": ylabel, "title": title,
+    }
+
+
+def series_spec(name, index, lines, xlabel, ylabel, title, figsize=(12, 5), table=None, style=None,
+                title_style=None, label_style=None, legend_style=None, grid_style=None):
+    """时间序列图；lines 为 [(数值, plot 参数), ...]，table 为 (单元格, 列名) 时在下方加结果表格"""
+    return {
+        "name": name, "kind": "series", "figsize": figsize, "style": style,
+        "index": np.asarray(index), "lines": [(np.asarray(values), kw) for values, kw in lines],
+        "xlabel": xlabel, "ylabel": ylabel, "title": title, "table": table,
+        "title_style": title_style or {}, "label_style": label_style or {},
+        "legend_style": legend_style or {}, "grid_style": grid_style or {},
+    }
+
+
+# ===============================
+# 绘图
+# ===============================
+def draw_section(fig, spec):
+    ax = fig.add_subplot()
+    cf = ax.contourf(spec["x"], spec["y"], spec["field"], levels=spec["levels"], cmap=spec["cmap"], extend=spec["extend"])
+    cbar = fig.colorbar(cf, ax=ax)
+    cbar.set_label(spec["colorbar_label"])
+
+    if spec["contour"] is not None:
+        contours = ax.contour(spec["x"], spec["y"], spec["contour"], levels=spec["contour_levels"], **spec["contour_style"])
+        ax.clabel(contours, inline=True, fontsize=8, fmt="%.1f")
+
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    ax.set_title(spec["title"])
+    ax.invert_yaxis()
+
+
+def draw_series(fig, spec):
+    if spec["table"] is None:
+        ax = fig.add_subplot()
+    else:
+        ax, ax_table = fig.subplots(2, 1, gridspec_kw={"height_ratios": [3, 1]})
+
+    for values, kw in spec["lines"]:
+        ax.plot(spec["index"], values, **kw)
+    ax.set_title(spec["title"], **spec["title_style"])
+    ax.set_xlabel(spec["xlabel"], **spec["label_style"])
+    ax.set_ylabel(spec["ylabel"], **spec["label_style"])
+    ax.legend(**spec["legend_style"])
+    ax.grid(True, **spec["grid_style"])
+
+    if spec["table"] is not None:
+        cell_text, col_labels = spec["table"]
+        ax_table.axis("tight")
+        ax_table.axis("off")
+        ax_table.table(cellText=cell_text, colLabels=col_labels, cellLoc="center", loc="center", bbox=[0.2, 0.1, 0.6, 0.8])
+        fig.tight_layout()
+
+
+drawers = {"section": draw_section, "series": draw_series}
+
+
+def _draw(fig, spec):
+    with stage("render.draw", spec["name"]):
+        drawers[spec["kind"]](fig, spec)
+
+
+def show_figures(specs):
+    """交互模式：逐张弹出窗口"""
+    import matplotlib.pyplot as plt
+    for spec in specs:
+        with matplotlib.style.context(spec.get("style") or {}):
+            fig = plt.figure(figsize=spec["figsize"])
+            _draw(fig, spec)
+        plt.show()
+
+
+# ===============================
+# 批量输出
+# ===============================
+def spec_digest(spec):
+    """图件输入（数组和样式）的 SHA-1，用于跳过没有变化的图"""
+    digest = hashlib.sha1()
+    for key in sorted(spec):
+        value = spec[key]
+        digest.update(key.encode())
+        if isinstance(value, np.ndarray):
+            digest.update(str(value.dtype).encode() + str(value.shape).encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif key == "lines":
+            for values, kw in value:
+                digest.update(np.ascontiguousarray(values).tobytes() + repr(sorted(kw.items())).encode())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def _render_one(spec, output_dir, formats):
+    """在工作进程中执行：不经过 pyplot，直接用 Figure 写出各格式文件，返回图名和性能记录"""
+    with matplotlib.style.context(spec.get("style") or {}):
+        fig = Figure(figsize=spec["figsize"])
+        _draw(fig, spec)
+        for fmt in formats:
+            with stage("render.save", f"{spec['name']}.{fmt}"):
+                fig.savefig(os.path.join(output_dir, f"{spec['name']}.{fmt}"), format=fmt)
+    return spec["name"], argo_profile.drain()
+
+
+def render_figures(specs, output_dir, formats=("png",), n_workers=None, skip_unchanged=True):
+    """多进程输出图片到 output_dir，文件名为 <name>.<格式>；返回实际重新绘制的图名"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, render_manifest_name)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    digests = {spec["name"]: spec_digest(spec) for spec in specs}
+    todo = []
+    for spec in specs:
+        outputs = [os.path.join(output_dir, f"{spec['name']}.{fmt}") for fmt in formats]
+        if skip_unchanged and manifest.get(spec["name"]) == digests[spec["name"]] and all(map(os.path.exists, outputs)):
+            continue
+        todo.append(spec)
+    print(f"需要绘制 {len(todo)} 张图，跳过 {len(specs) - len(todo)} 张没有变化的图")
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(todo)))
+
+    if n_workers == 1:
+        results = [_render_one(spec, output_dir, formats) for spec in progress(todo, file=lambda spec: spec["name"])]
+    else:
+        # 与 argo_parallel 一致使用 spawn，避免 fork 后 Zarr 后台线程死锁
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_render_one, spec, output_dir, formats) for spec in todo]
+            results = [future.result() for future in progress(futures, "render.collect")]
+
+    rendered = []
+    for name, records in results:
+        argo_profile.extend(records)
+        rendered.append(name)
+
+    for name in rendered:
+        manifest[name] = digests[name]
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    return rendered
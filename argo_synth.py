@@ -0,0 +1,165 @@
+import os
+import argparse
+import numpy as np
+import xarray as xr
+import dask
+import dask.array
+
+# ===============================
+# 合成 RG Argo 数据：与真实数据相同的文件布局，用于在没有原始数据（数 GB）的机器上测试和测量性能
+#   <root>/RG_ArgoClim_Temperature_<release>/RG_ArgoClim_Temperature_<release>.nc    年文件，TIME 为自 2004-01 起的月数
+#   <root>/RG_ArgoClim_Temperature_<release>/RG_ArgoClim_YYYYMM_<release>.nc         月文件，只含一个月的异常场
+# 盐度目录相同。与真实数据一样，月文件同时包含温度和盐度的 *_ANOMALY，两个目录中的月文件相同。
+# 陆地和海底以下的格点为 NaN，掩码不随时间变化。
+# ===============================
+
+# 真实数据的 58 个压力层（dbar）
+full_pressure = np.array([
+    2.5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120, 130, 140, 150, 160, 170, 182.5, 200,
+    220, 240, 260, 280, 300, 320, 340, 360, 380, 400, 420, 440, 462.5, 500, 550, 600, 650, 700, 750, 800,
+    850, 900, 950, 1000, 1050, 1100, 1150, 1200, 1250, 1300, 1350, 1412.5, 1500, 1600, 1700, 1800, 1900, 1975,
+])
+
+# 网格大小：(纬度数, 经度数, 压力层数)；"full" 与真实数据相同（1° 网格，64.5°S–79.5°N，20.5°E–379.5°E）
+sizes = {
+    "tiny": (15, 36, 10),
+    "small": (36, 90, 20),
+    "medium": (73, 180, 40),
+    "full": (145, 360, 58),
+}
+
+kinds = {"Temperature": "TEMPERATURE", "Salinity": "SALINITY"}
+time_units = "months since 2004-01-01 00:00:00"
+
+
+def make_grid(size="small"):
+    """返回 (LATITUDE, LONGITUDE, PRESSURE)，较小的网格在真实网格的范围内均匀抽取"""
+    n_lat, n_lon, n_pressure = sizes[size] if isinstance(size, str) else size
+    lat = np.arange(-64.5, 80, 1.0)
+    lon = np.arange(20.5, 380, 1.0)
+    pick = lambda values, n: values[np.round(np.linspace(0, len(values) - 1, n)).astype(int)]
+    return pick(lat, n_lat), pick(lon, n_lon), pick(full_pressure, n_pressure)
+
+
+def land_mask(lat, lon, pressure, seed=0):
+    """海洋格点为 1、陆地和海底以下为 NaN；海底深度是经纬度的平滑随机函数，并有几块大陆"""
+    rng = np.random.default_rng(seed)
+    lat2, lon2 = np.meshgrid(np.deg2rad(lat), np.deg2rad(lon), indexing="ij")
+    depth = 4000 + 1000 * np.sin(3 * lon2 + rng.uniform(0, 2 * np.pi)) * np.cos(2 * lat2)
+    for _ in range(4):
+        c_lat, c_lon = rng.uniform(-0.5, 1.2), rng.uniform(0, 2 * np.pi)
+        distance = np.hypot(lat2 - c_lat, np.angle(np.exp(1j * (lon2 - c_lon))) * np.cos(c_lat))
+        depth = np.where(distance < rng.uniform(0.2, 0.5), 0.0, depth)
+        # 大陆架：靠近大陆的地方较浅
+        depth = np.minimum(depth, 200 + 8000 * np.maximum(distance - 0.3, 0))
+    return np.where(pressure[:, None, None] < depth[None], 1.0, np.nan)
+
+
+def mean_field(kind, lat, pressure, mask):
+    """气候态平均场：温度随深度和纬度降低，盐度在 34–35.5 之间"""
+    lat3 = np.deg2rad(lat)[None, :, None]
+    p3 = pressure[:, None, None]
+    if kind == "Temperature":
+        field = 2 + 24 * np.cos(lat3) ** 2 * np.exp(-p3 / 700)
+    else:
+        field = 34.2 + 1.2 * np.cos(lat3) ** 2 * np.exp(-p3 / 500)
+    return (field * mask).astype(np.float32)
+
+
+def anomaly_month(kind, t, lat, lon, pressure, mask, seed=0):
+    """第 t 个月（自 2004-01 起）的异常场：线性趋势 + 季节循环 + 噪声，同一 (seed, t) 结果相同"""
+    rng = np.random.default_rng([seed, t])
+    scale = 1.0 if kind == "Temperature" else 0.1
+    p3 = pressure[:, None, None]
+    lat3 = np.deg2rad(lat)[None, :, None]
+    trend = 0.002 * t * np.exp(-p3 / 1000)
+    seasonal = 0.5 * np.sin(2 * np.pi * (t % 12) / 12) * np.sin(lat3) * np.exp(-p3 / 100)
+    noise = 0.2 * rng.standard_normal((len(pressure), len(lat), len(lon)))
+    return ((trend + seasonal + noise) * scale * mask).astype(np.float32)
+
+
+def _annual(kind, months, lat, lon, pressure, mask, seed):
+    """年文件的 Dataset；异常场用 dask 按月生成，写文件时逐月计算，不会一次占用整个数据立方体的内存"""
+    shape = (len(pressure), len(lat), len(lon))
+    fields = [dask.array.from_delayed(dask.delayed(anomaly_month)(kind, t, lat, lon, pressure, mask, seed), shape, np.float32)
+              for t in months]
+    var = kinds[kind]
+    return xr.Dataset(
+        {
+            f"ARGO_{var}_ANOMALY": (("TIME", "PRESSURE", "LATITUDE", "LONGITUDE"), dask.array.stack(fields)),
+            f"ARGO_{var}_MEAN": (("PRESSURE", "LATITUDE", "LONGITUDE"), mean_field(kind, lat, pressure, mask)),
+        },
+        coords={"TIME": ("TIME", np.asarray(months) + 0.5, {"units": time_units}),
+                "PRESSURE": pressure, "LATITUDE": lat, "LONGITUDE": lon},
+    )
+
+
+def _monthly(kinds_to_write, t, lat, lon, pressure, mask, seed):
+    """月文件的 Dataset，包含 kinds_to_write 中每种数据的异常场"""
+    return xr.Dataset(
+        {f"ARGO_{kinds[kind]}_ANOMALY": (("TIME", "PRESSURE", "LATITUDE", "LONGITUDE"),
+                                         anomaly_month(kind, t, lat, lon, pressure, mask, seed)[np.newaxis])
+         for kind in kinds_to_write},
+        coords={"TIME": ("TIME", [t + 0.5], {"units": time_units}),
+                "PRESSURE": pressure, "LATITUDE": lat, "LONGITUDE": lon},
+    )
+
+
+def monthly_name(t, release=2019):
+    """第 t 个月（自 2004-01 起）的月文件名"""
+    year, month = 2004 + t // 12, t % 12 + 1
+    return f"RG_ArgoClim_{year}{month:02d}_{release}.nc"
+
+
+def write_month(data_dirs, t, size="small", release=2019, seed=0, anomaly_seed=None):
+    """为 write_archive 返回的 {类型: 目录} 写入（或覆盖）第 t 个月的月文件
+
+    anomaly_seed 不为 None 时异常场改用该随机数种子（掩码不变），用于模拟被修订后重新发布的月文件。
+    """
+    lat, lon, pressure = make_grid(size)
+    mask = land_mask(lat, lon, pressure, seed)
+    monthly = _monthly(tuple(data_dirs), t, lat, lon, pressure, mask, seed if anomaly_seed is None else anomaly_seed)
+    for data_dir in data_dirs.values():
+        monthly.to_netcdf(os.path.join(data_dir, monthly_name(t, release)))
+
+
+def write_archive(root, size="small", annual_years=3, monthly_months=3, release=2019,
+                  kinds_to_write=("Temperature", "Salinity"), seed=0):
+    """在 root 下生成温度、盐度两个数据目录，返回 {类型: 目录}
+
+    年文件覆盖 2004-01 起的 annual_years 年，之后的 monthly_months 个月各写一个月文件
+    （同时包含所有 kinds_to_write 的异常场，每个目录各写一份）。
+    """
+    lat, lon, pressure = make_grid(size)
+    mask = land_mask(lat, lon, pressure, seed)
+    n_annual = annual_years * 12
+
+    data_dirs = {}
+    for kind in kinds_to_write:
+        data_dir = os.path.join(root, f"RG_ArgoClim_{kind}_{release}")
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"正在生成 {data_dir}")
+
+        annual = _annual(kind, range(n_annual), lat, lon, pressure, mask, seed)
+        annual.to_netcdf(os.path.join(data_dir, f"RG_ArgoClim_{kind}_{release}.nc"))
+        data_dirs[kind] = data_dir
+
+    for t in range(n_annual, n_annual + monthly_months):
+        monthly = _monthly(kinds_to_write, t, lat, lon, pressure, mask, seed)
+        for data_dir in data_dirs.values():
+            monthly.to_netcdf(os.path.join(data_dir, monthly_name(t, release)))
+    return data_dirs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成与 RG Argo 相同布局的合成数据（不需要网络）")
+    parser.add_argument("root", help="输出目录，会在其中建立温度和盐度两个数据目录")
+    parser.add_argument("--size", default="small", choices=sorted(sizes), help="网格大小")
+    parser.add_argument("--years", type=int, default=3, help="年文件覆盖的年数（自 2004 年起）")
+    parser.add_argument("--months", type=int, default=3, help="年文件之后的月文件个数")
+    parser.add_argument("--release", type=int, default=2019, help="文件名中的版本年份")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for kind, data_dir in write_archive(args.root, args.size, args.years, args.months, args.release, seed=args.seed).items():
+        print(f"{kind}: {data_dir}")
@@ -0,0 +1,198 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import stats
+from argo_ingest import ensure_store, store_digest
+from argo_reduce import products_dir, range_key
+from argo_profile import stage, progress
+
+# ===============================
+# 1. 最小二乘充分统计量
+# ===============================
+# 对每个格点累积 n、Σt、Σt²、Σy、Σty、Σy²，数据逐块读入，内存只与单个时间块和格点数有关
+stat_names = ("n", "st", "stt", "sy", "sty", "syy")
+
+
+def time_in_years(time, t0=2004.0):
+    """TIME 转换为数值年份（与原脚本一致：year + (month - 1) / 12），减去 t0 以减小舍入误差"""
+    time = xr.DataArray(time, dims="TIME") if not isinstance(time, xr.DataArray) else time
+    return (time.dt.year + (time.dt.month - 1) / 12.0 - t0).values
+
+
+class TrendAccumulator:
+    """逐块累积每个格点的线性趋势统计量，缺测（NaN）格点逐点跳过"""
+
+    def __init__(self, t0=2004.0):
+        self.t0 = t0
+        self.dims = None
+        self.coords = None
+        self.stats = None
+        self.months = pd.DatetimeIndex([])
+        self.attrs = {}
+
+    def update(self, da, sign=1):
+        """加入一个时间块（da 必须包含 TIME 维度）；sign=-1 表示移除之前加入的数据"""
+        da = da.transpose("TIME", ...)
+        if self.stats is None:
+            self.dims = da.dims[1:]
+            self.coords = {dim: da[dim].values for dim in self.dims if dim in da.coords}
+            self.stats = {name: np.zeros(da.shape[1:]) for name in stat_names}
+
+        y = np.asarray(da.values, dtype=np.float64)
+        t = time_in_years(da["TIME"], self.t0).reshape((-1,) + (1,) * (y.ndim - 1))
+        valid = np.isfinite(y)
+        y = np.where(valid, y, 0.0)
+        tv = np.where(valid, t, 0.0)
+
+        self.stats["n"] += sign * valid.sum(axis=0)
+        self.stats["st"] += sign * tv.sum(axis=0)
+        self.stats["stt"] += sign * (tv * tv).sum(axis=0)
+        self.stats["sy"] += sign * y.sum(axis=0)
+        self.stats["sty"] += sign * (tv * y).sum(axis=0)
+        self.stats["syy"] += sign * (y * y).sum(axis=0)
+
+        times = pd.DatetimeIndex(da["TIME"].values)
+        self.months = self.months.union(times) if sign > 0 else self.months.difference(times)
+        return self
+
+    def remove(self, da):
+        """移除之前加入的时间块（例如被替换的月文件）"""
+        return self.update(da, sign=-1)
+
+    def result(self):
+        """返回每个格点的 slope（每年）、intercept（t0 处）、stderr、pvalue 和有效样本数 n"""
+        s = self.stats
+        n = s["n"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sxx = s["stt"] - s["st"] ** 2 / n
+            sxy = s["sty"] - s["st"] * s["sy"] / n
+            syy = s["syy"] - s["sy"] ** 2 / n
+
+            ok = (n > 2) & (sxx > 0)
+            slope = np.where(ok, sxy / sxx, np.nan)
+            intercept = np.where(ok, (s["sy"] - slope * s["st"]) / n, np.nan)
+            sse = np.clip(syy - slope * sxy, 0.0, None)
+            dof = np.where(ok, n - 2, np.nan)
+            stderr = np.sqrt(sse / dof / sxx)
+            pvalue = 2 * stats.t.sf(np.abs(slope / stderr), dof)
+
+        fields = {"slope": slope, "intercept": intercept, "stderr": stderr, "pvalue": pvalue, "n": n}
+        ds = xr.Dataset({name: (self.dims, value) for name, value in fields.items()}, coords=self.coords)
+        ds.attrs["t0"] = self.t0
+        return ds
+
+    def to_dataset(self):
+        """导出累积量，便于保存到磁盘后继续累积"""
+        ds = xr.Dataset({name: (self.dims, value) for name, value in self.stats.items()}, coords=self.coords)
+        ds = ds.assign_coords(MONTH=("MONTH", self.months.values))
+        ds.attrs.update(self.attrs)
+        ds.attrs["t0"] = self.t0
+        return ds
+
+    @classmethod
+    def from_dataset(cls, ds):
+        acc = cls(t0=ds.attrs["t0"])
+        acc.dims = ds[stat_names[0]].dims
+        acc.coords = {dim: ds[dim].values for dim in acc.dims if dim in ds.coords}
+        acc.stats = {name: ds[name].values.astype(np.float64) for name in stat_names}
+        acc.months = pd.DatetimeIndex(ds["MONTH"].values)
+        acc.attrs = {k: v for k, v in ds.attrs.items() if k != "t0"}
+        return acc
+
+    def save(self, path):
+        self.to_dataset().to_netcdf(path)
+
+    @classmethod
+    def load(cls, path):
+        with xr.open_dataset(path) as ds:
+            return cls.from_dataset(ds.load())
+
+
+# ===============================
+# 2. 逐块读取并拟合
+# ===============================
+def iter_time_blocks(da, size=None):
+    """按 TIME 分块读入内存，默认与 Zarr 缓存的时间分块一致"""
+    if size is None:
+        size = da.chunks[da.dims.index("TIME")][0] if da.chunks else 12
+    for start in range(0, da.sizes["TIME"], size):
+        yield da.isel(TIME=slice(start, start + size)).load()
+
+
+def fit_trend(ds, variable, block_size=None, t0=2004.0):
+    """对 ds[variable] 逐时间块累积，返回每个格点的线性趋势（不需要把整个数据立方体读入内存）"""
+    acc = TrendAccumulator(t0=t0)
+    for block in progress(iter_time_blocks(ds[variable], block_size), "trend.read"):
+        with stage("trend.block"):
+            acc.update(block)
+    return acc.result()
+
+
+# ===============================
+# 3. 趋势累积量缓存（新月份只需累积一次）
+# ===============================
+def trend_input(ds, variable, lat_range=None, zonal=False):
+    """截取纬度范围，zonal=True 时先沿经度取平均（深度–纬度图）"""
+    if lat_range is not None:
+        ds = ds.sel(LATITUDE=slice(lat_range[0], lat_range[1]))
+    da = ds[variable]
+    if zonal and "LONGITUDE" in da.dims:
+        da = da.mean(dim="LONGITUDE")
+    return da
+
+
+def trend_cache_path(data_dir, variable, lat_range=None, zonal=False):
+    key = "_".join([range_key("lat", lat_range), "zonal" if zonal else "3d"])
+    return os.path.join(products_dir(data_dir), f"trend_{variable}_{key}.nc")
+
+
+def load_trend(data_dir, variable, lat_range=None, zonal=False, t0=2004.0):
+    """读取保存的累积量，只累积缓存中还没有的月份，返回每个格点的趋势
+
+    累积量记录了缓存的摘要，缓存内容变了（而没有经过 argo_refresh 扣除旧数据）时重新累积。
+    """
+    da = trend_input(ensure_store(data_dir), variable, lat_range, zonal)
+    cache_path = trend_cache_path(data_dir, variable, lat_range, zonal)
+    months = pd.DatetimeIndex(da["TIME"].values)
+    digest = store_digest(data_dir)
+
+    acc = None
+    if os.path.exists(cache_path):
+        acc = TrendAccumulator.load(cache_path)
+        if not acc.months.isin(months).all() or acc.attrs.get("store_digest") != digest:
+            acc = None
+    if acc is None:
+        acc = TrendAccumulator(t0=t0)
+        acc.attrs = {"data_dir": data_dir, "variable": variable, "zonal": int(zonal)}
+        if lat_range is not None:
+            acc.attrs["lat_range"] = np.asarray(lat_range, dtype=float)
+
+    missing = months.difference(acc.months)
+    if missing.empty:
+        return acc.result()
+    for block in progress(iter_time_blocks(da.sel(TIME=missing)), "trend.read"):
+        with stage("trend.block"):
+            acc.update(block)
+
+    acc.attrs["store_digest"] = digest
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    acc.save(cache_path)
+    return acc.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="逐格点计算 RG Argo 异常场的线性趋势")
+    parser.add_argument("data_dir", help="年文件和月文件所在目录")
+    parser.add_argument("variable", help="例如 ARGO_TEMPERATURE_ANOMALY")
+    parser.add_argument("output", help="输出 NetCDF 文件")
+    parser.add_argument("--lat", nargs=2, type=float, default=(-65, -40), help="纬度范围")
+    parser.add_argument("--zonal", action="store_true", help="先沿经度取平均（深度–纬度图）；默认保留经度，输出三维趋势")
+    args = parser.parse_args()
+
+    ds = ensure_store(args.data_dir).sel(LATITUDE=slice(args.lat[0], args.lat[1]))
+    if args.zonal:
+        ds = ds.mean(dim="LONGITUDE")
+    fit_trend(ds, args.variable).to_netcdf(args.output)
+    print(f"已生成 {args.output}")